@@ -0,0 +1,178 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import numpy as np
+import os
+import os.path
+import pandas as pd
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from datetime import datetime
+from data import HistoricCSVDataHandler, DataSource
+from dispatch import EventQueue
+from execution import SimulateExecutionHandler
+from loop import run, backtest, STRATEGIES, DEFAULT_PARAMETERS
+from portfolio import NaivePortfolio
+
+def generate_ohlcv(bars, symbols=1, frequency='D', start='2000-01-01', seed=0, volatility=0.01):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start, periods=bars, freq=frequency, name='Date')
+
+    close = 100.0 * np.exp(np.cumsum(rng.normal(0.0, volatility, (bars, symbols)), axis=0))
+    opening = np.empty_like(close)
+    opening[0] = 100.0
+    opening[1:] = close[:-1]
+    spread = np.abs(rng.normal(0.0, volatility, (bars, symbols))) * close
+    high = np.maximum(opening, close) + spread
+    low = np.maximum(np.minimum(opening, close) - spread, 0.01)
+    volume = rng.integers(1000, 1000000, (bars, symbols))
+
+    frames = {}
+    for j in range(symbols):
+        frames['SYN{0:03d}'.format(j)] = pd.DataFrame({'Open': opening[:, j], 'High': high[:, j], 'Low': low[:, j], 'Close': close[:, j], 'Volume': volume[:, j]}, index=index)
+
+    return frames
+
+def write_csv(frames, csv_dir, source=DataSource.NASDAQ):
+    os.makedirs(csv_dir, exist_ok=True)
+    for symbol, df in frames.items():
+        path = os.path.join(csv_dir, symbol + '.csv')
+        if source == DataSource.NASDAQ:
+            average = (df['High'] + df['Low'] + df['Close']) / 3.0
+            out = pd.DataFrame({'High price': df['High'], 'Low price': df['Low'], 'Closing price': df['Close'], 'Average price': average,
+                                'Total volume': df['Volume'], 'Turnover': df['Volume'] * average, '': ''}, index=df.index)
+            out.iloc[::-1].to_csv(path, float_format='%.4f')
+        else:
+            out = pd.DataFrame({'Open': df['Open'], 'High': df['High'], 'Low': df['Low'], 'Close': df['Close'],
+                                'Adj Close': df['Close'], 'Volume': df['Volume']}, index=df.index)
+            out.to_csv(path, float_format='%.6f')
+
+def _timed(function, timings, name):
+    def timed(*args):
+        start = time.perf_counter()
+        result = function(*args)
+        timings[name] += time.perf_counter() - start
+        return result
+    return timed
+
+def _peak_memory():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def _create(csv_dir, symbol_list, source, strategy, parameters, initial_capital, dtype='float64', scale=None):
+    events = EventQueue()
+    data = HistoricCSVDataHandler(events, csv_dir, symbol_list, source, dtype=np.dtype(dtype), scale=scale)
+    portfolio = NaivePortfolio(data, events, '', initial_capital=initial_capital)
+    strategy = STRATEGIES[strategy](data, events, portfolio, **parameters)
+    portfolio.strategy_name = strategy.name
+    broker = SimulateExecutionHandler(events)
+    return events, data, portfolio, strategy, broker
+
+def run_case(csv_dir, symbol_list, source, strategy, parameters, initial_capital, dtype='float64', scale=None):
+    # Strategies print their trades, which would be timed as well.
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        events, data, portfolio, strategy_instance, broker = _create(csv_dir, symbol_list, source, strategy, parameters, initial_capital, dtype, scale)
+        load = time.perf_counter() - start
+        bars = data.get_bar_count()
+        bar_bytes = data.bars.nbytes
+
+        start = time.perf_counter()
+        backtest(events, data, portfolio, strategy_instance, broker, plot=False)
+        elapsed = time.perf_counter() - start
+
+        events, data, portfolio, strategy_instance, broker = _create(csv_dir, symbol_list, source, strategy, parameters, initial_capital, dtype, scale)
+        timings = {'update_latest_data': 0.0, 'calculate_signals': 0.0, 'update_timeindex': 0.0, 'summary_stats': 0.0}
+        data.update_latest_data = _timed(data.update_latest_data, timings, 'update_latest_data')
+        strategy_instance.calculate_signals = _timed(strategy_instance.calculate_signals, timings, 'calculate_signals')
+        portfolio.update_timeindex = _timed(portfolio.update_timeindex, timings, 'update_timeindex')
+        run(events, data, portfolio, strategy_instance, broker)
+        _timed(portfolio.summary_stats, timings, 'summary_stats')()
+
+    return {'strategy': strategy,
+            'parameters': parameters,
+            'bars': bars,
+            'symbols': len(symbol_list),
+            'dtype': dtype,
+            'scale': scale,
+            'bar_store_bytes': bar_bytes,
+            'bytes_per_bar': bar_bytes / (bars * len(symbol_list)),
+            'load_seconds': load,
+            'backtest_seconds': elapsed,
+            'bars_per_second': bars / elapsed,
+            'components': {name: {'seconds': seconds, 'bars_per_second': bars / seconds if seconds > 0 else None} for name, seconds in timings.items()},
+            'peak_memory_bytes': _peak_memory()}
+
+def _git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+def run_benchmarks(bars=[10000], symbols=[1], strategies=['buy-and-hold'], frequency='D', source=DataSource.NASDAQ, initial_capital=100000.0, seed=0, dtypes=['float64'], scale=None):
+    results = []
+    # Every case runs in a fresh process so that its peak memory is its own.
+    context = multiprocessing.get_context('spawn')
+    for bar_count in bars:
+        for symbol_count in symbols:
+            with tempfile.TemporaryDirectory() as csv_dir:
+                frames = generate_ohlcv(bar_count, symbol_count, frequency, seed=seed)
+                write_csv(frames, csv_dir, source)
+                symbol_list = list(frames.keys())
+                del frames
+
+                for strategy in strategies:
+                    for dtype in dtypes:
+                        parameters = dict(DEFAULT_PARAMETERS.get(strategy, {}))
+                        # Integer prices are only stored with a scale.
+                        dtype_scale = scale if np.dtype(dtype).kind == 'i' else None
+                        with context.Pool(1) as pool:
+                            result = pool.apply(run_case, (csv_dir, symbol_list, source, strategy, parameters, initial_capital, dtype, dtype_scale))
+                        result['frequency'] = frequency
+                        result['source'] = source.value
+                        results.append(result)
+
+    return {'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'results': results}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the event-driven backtester on synthetic data.')
+    parser.add_argument('--bars', type=int, nargs='+', default=[10000])
+    parser.add_argument('--symbols', type=int, nargs='+', default=[1])
+    parser.add_argument('--strategy', nargs='+', choices=sorted(STRATEGIES.keys()), default=['buy-and-hold'])
+    parser.add_argument('--frequency', default='D')
+    parser.add_argument('--source', choices=['NASDAQ', 'YAHOO'], default='NASDAQ')
+    parser.add_argument('--initial-capital', type=float, default=100000.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dtype', nargs='+', choices=['float64', 'float32', 'int32'], default=['float64'],
+                        help='how prices other than the close are stored; float32 also stores volumes as float32, which rounds volumes above 2**24')
+    parser.add_argument('--scale', type=int, default=10000, help='integer prices are stored in units of 1/scale')
+    parser.add_argument('--output', default=None)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_benchmarks(args.bars, args.symbols, args.strategy, args.frequency, DataSource(args.source), args.initial_capital, args.seed, args.dtype, args.scale)
+    output = json.dumps(report, indent=2)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import numpy as np
+import os
+import os.path
+import pandas as pd
+import shutil
+import tempfile
+
+CACHE_VERSION = 3
+
+class BarCache:
+    def __init__(self, cache_dir='.cache/', max_bytes=None, enabled=True):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+
+    def _key(self, path, source):
+        stat = os.stat(path)
+        key = '{0}|{1}|{2}|{3}|{4}'.format(CACHE_VERSION, os.path.abspath(path), stat.st_size, stat.st_mtime_ns, source.value)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _entries(self):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        return [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if not name.startswith('.')]
+
+    def _entry_size(self, entry):
+        return sum(os.path.getsize(os.path.join(entry, name)) for name in os.listdir(entry))
+
+    def load(self, path, source):
+        if not self.enabled:
+            return None
+
+        entry = os.path.join(self.cache_dir, self._key(path, source))
+        try:
+            with open(os.path.join(entry, 'meta.json')) as f:
+                meta = json.load(f)
+            index = np.load(os.path.join(entry, 'index.npy'), mmap_mode='r')
+            columns = {name: np.load(os.path.join(entry, '{0}.npy'.format(i)), mmap_mode='r') for i, name in enumerate(meta['columns'])}
+        except (OSError, ValueError, KeyError):
+            return None
+
+        # The modification time of an entry doubles as its last use for eviction.
+        os.utime(entry)
+        return pd.DataFrame(columns, index=pd.DatetimeIndex(index.view('datetime64[ns]'), name=meta['index']), copy=False)
+
+    def store(self, path, source, frame):
+        if not self.enabled:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry = os.path.join(self.cache_dir, self._key(path, source))
+        tmp = tempfile.mkdtemp(prefix='.', dir=self.cache_dir)
+        try:
+            np.save(os.path.join(tmp, 'index.npy'), frame.index.values.astype('datetime64[ns]').view(np.int64))
+            for i, name in enumerate(frame.columns):
+                np.save(os.path.join(tmp, '{0}.npy'.format(i)), frame[name].to_numpy(dtype=np.float64))
+            with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+                json.dump({'path': os.path.abspath(path), 'source': source.value, 'index': frame.index.name, 'columns': list(frame.columns)}, f)
+            os.replace(tmp, entry)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+
+        self.evict()
+
+    def evict(self):
+        if self.max_bytes is None:
+            return
+
+        entries = sorted(self._entries(), key=os.path.getmtime)
+        sizes = {entry: self._entry_size(entry) for entry in entries}
+        total = sum(sizes.values())
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= sizes[entry]
+
+    def invalidate(self, path=None):
+        for entry in self._entries():
+            if path is not None:
+                try:
+                    with open(os.path.join(entry, 'meta.json')) as f:
+                        if json.load(f)['path'] != os.path.abspath(path):
+                            continue
+                except (OSError, ValueError, KeyError):
+                    pass
+            shutil.rmtree(entry, ignore_errors=True)
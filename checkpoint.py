@@ -0,0 +1,72 @@
+import os
+import pickle
+
+from dispatch import EventQueue
+
+CHECKPOINT_VERSION = 1
+
+class _Pickler(pickle.Pickler):
+    # The data handler, its bars and the event queue are saved by name only,
+    # so a checkpoint holds the state of a run but not its price data.
+    def __init__(self, file, shared):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.shared = {id(obj): name for name, obj in shared.items()}
+
+    def persistent_id(self, obj):
+        return self.shared.get(id(obj))
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, shared):
+        super().__init__(file)
+        self.shared = shared
+
+    def persistent_load(self, pid):
+        return self.shared[pid]
+
+def _shared(data, events):
+    return {'data': data, 'bars': data.bars, 'events': events}
+
+def _pending(events):
+    if isinstance(events, EventQueue):
+        return list(events.deque)
+    return list(events.queue)
+
+def save_checkpoint(path, data, events, portfolio, strategy, broker):
+    datetime, _ = data.bars.latest()
+    state = {'version': CHECKPOINT_VERSION,
+             'symbol_list': list(data.symbol_list),
+             'datetime': datetime,
+             'subscriptions': dict(getattr(data, 'subscriptions', {})),
+             'pending': _pending(events),
+             'portfolio': portfolio,
+             'strategy': strategy,
+             'broker': broker}
+
+    # A run that dies while saving leaves the previous checkpoint in place.
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        _Pickler(f, _shared(data, events)).dump(state)
+    os.replace(temporary, path)
+
+def load_checkpoint(path, data, events):
+    with open(path, 'rb') as f:
+        state = _Unpickler(f, _shared(data, events)).load()
+
+    if state['version'] != CHECKPOINT_VERSION:
+        raise ValueError("Checkpoint version {0} is not supported, expected {1}.".format(state['version'], CHECKPOINT_VERSION))
+    if state['symbol_list'] != list(data.symbol_list):
+        raise ValueError("Checkpoint is for symbols {0}, not {1}.".format(state['symbol_list'], list(data.symbol_list)))
+
+    # Streaming handlers keep only as many bars as the strategy subscribed
+    # to, which it did when it was created rather than unpickled.
+    for symbol, N in state.get('subscriptions', {}).items():
+        data.subscribe(symbol, N)
+
+    # The data continues after the last bar the run had seen, so bars
+    # appended to the files since are the next ones.
+    if state['datetime'] is not None:
+        data.bars.seek(state['datetime'])
+    for event in state['pending']:
+        events.put(event)
+
+    return state['portfolio'], state['strategy'], state['broker']
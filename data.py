@@ -1,10 +1,14 @@
+import heapq
+import numpy as np
 import pandas as pd
 import os.path
 import queue
-import quandl
 
 from abc import ABCMeta, abstractmethod
+from collections import deque
 from event import MarketEvent
+from fetch import QuandlClient, SeriesFetcher, SeriesStore
+from stream import read_csv_chunks
 from datetime import datetime
 from enum import Enum
 
@@ -23,16 +27,360 @@ class DataHandler(metaclass=ABCMeta):
     def update_latest_data(self):
         raise NotImplementedError
 
+    def get_bar_count(self):
+        bars = getattr(self, 'bars', None)
+        return bars.length if bars is not None else None
+
+    def subscribe(self, symbol, N):
+        # Strategies declare the longest window they read per symbol, which is
+        # as much history as a streaming handler has to keep.
+        if symbol not in self.symbol_list:
+            raise KeyError(symbol)
+        if not hasattr(self, 'subscriptions'):
+            self.subscriptions = {}
+        self.subscriptions[symbol] = max(self.subscriptions.get(symbol, 1), N)
+        reserve = getattr(self.bars, 'reserve', None)
+        if reserve is not None:
+            reserve(self.subscriptions[symbol])
+
+    def get_window(self, symbol):
+        return self.bars.window(symbol, getattr(self, 'subscriptions', {}).get(symbol, 1))
+
+class BarWindow:
+    def __init__(self, bars, symbol, start, end):
+        self.bars = bars
+        self.symbol = symbol
+        self.start = start
+        self.end = end
+
+    @property
+    def time(self):
+        return self.bars.time[self.symbol][self.start:self.end]
+
+    @property
+    def close(self):
+        return self.bars.close[self.symbol][self.start:self.end]
+
+    def column(self, name):
+        columns = self.bars.columns[self.symbol]
+        if name not in columns:
+            raise KeyError("There is no {0} column for {1}, only {2}.".format(name, self.symbol, ', '.join(columns)))
+        return columns[name][self.start:self.end]
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __getitem__(self, i):
+        r = range(self.start, self.end)[i]
+        if isinstance(r, range):
+            if r.step == 1:
+                return BarWindow(self.bars, self.symbol, r.start, r.stop)
+            return [self.bars.bar(self.symbol, j) for j in r]
+        return self.bars.bar(self.symbol, r)
+
+    def __iter__(self):
+        for j in range(self.start, self.end):
+            yield self.bars.bar(self.symbol, j)
+
+def forward_fill(prices):
+    missing = np.isnan(prices)
+    if not missing.any():
+        return prices
+    rows = np.where(missing, 0, np.arange(len(prices))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return prices[rows, np.arange(prices.shape[1])]
+
+PRICE_COLUMNS = ('Open', 'High', 'Low', 'Close', 'Adj Close')
+
+class ScaledColumn:
+    # Prices kept as integer multiples of 1/scale, e.g. cents with scale=100,
+    # and read back as float64. Missing prices are stored as the smallest
+    # integer of the dtype.
+    def __init__(self, values, scale):
+        self.values = values
+        self.scale = scale
+        self.missing = np.iinfo(values.dtype).min
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, key):
+        values = self.values[key]
+        prices = values / self.scale
+        if np.ndim(prices) == 0:
+            return prices if values != self.missing else np.nan
+        prices[values == self.missing] = np.nan
+        return prices
+
+def compact_column(name, values, dtype=np.float64, scale=None):
+    # Prices other than the close are stored in dtype, as float32 or as
+    # scaled integers. Volumes and turnover are float32 only with float32
+    # prices, which holds whole numbers exactly up to 2**24, and float64
+    # otherwise.
+    dtype = np.dtype(dtype)
+    if dtype == np.float32:
+        return np.array(values, dtype=np.float32)
+    if dtype == np.float64 or name not in PRICE_COLUMNS:
+        return np.array(values, dtype=np.float64)
+    if dtype.kind != 'i' or dtype.itemsize >= 8:
+        raise ValueError("Unsupported bar dtype {0}, expected float64, float32 or a signed integer of at most 32 bits.".format(dtype))
+    if scale is None:
+        raise ValueError("Integer prices need a scale.")
+
+    missing = np.isnan(values)
+    scaled = np.rint(np.where(missing, 0.0, values) * scale)
+    info = np.iinfo(dtype)
+    if len(scaled) > 0 and (scaled.max() >= info.max or scaled.min() <= info.min):
+        raise ValueError("{0} prices do not fit in {1} with scale {2}.".format(name, dtype, scale))
+    scaled = scaled.astype(dtype)
+    scaled[missing] = info.min
+    return ScaledColumn(scaled, scale)
+
+class BarStore:
+    def __init__(self, symbol_list, index, columns, prices=None):
+        self.symbol_list = symbol_list
+        self.columns = columns
+        self.length = min(len(self.columns[symbol]['Close']) for symbol in symbol_list)
+
+        # One row per bar and one column per symbol, so a bar is a single
+        # row vector however many symbols there are.
+        if prices is None:
+            prices = forward_fill(np.column_stack([self.columns[symbol]['Close'][:self.length] for symbol in symbol_list]))
+        self.prices = prices
+        # Dates are int64 nanoseconds since the epoch, shared by all symbols,
+        # and only become Timestamps when a bar is read.
+        self.dates = np.asarray(index[symbol_list[0]].values[:self.length], dtype='datetime64[ns]')
+
+        self.time = {symbol: self.dates for symbol in symbol_list}
+        self.close = {symbol: self.prices[:, j] for j, symbol in enumerate(symbol_list)}
+        # Windows start at the first bar a symbol has a price for, so it is
+        # skipped like before the start of the data until then.
+        priced = ~np.isnan(self.prices)
+        self.first = {symbol: int(np.argmax(priced[:, j])) if priced[:, j].any() else self.length for j, symbol in enumerate(symbol_list)}
+        self.cursor = 0
+
+    @property
+    def nbytes(self):
+        # The closes are views of the price matrix and are not counted twice.
+        return self.prices.nbytes + self.dates.nbytes + sum(column.nbytes for symbol in self.symbol_list for name, column in self.columns[symbol].items() if name != 'Close')
+
+    def advance(self):
+        if self.cursor >= self.length:
+            return False
+        self.cursor += 1
+        return True
+
+    def latest(self):
+        if self.cursor == 0:
+            return None, None
+        return self.dates[self.cursor - 1], self.prices[self.cursor - 1]
+
+    def seek(self, datetime):
+        # Places the cursor after the bar at datetime, as if every bar up to
+        # it had been read.
+        i = int(np.searchsorted(self.dates, datetime, side='right'))
+        if i == 0 or self.dates[i - 1] != datetime:
+            raise ValueError("There is no bar at {0}.".format(datetime))
+        self.cursor = i
+
+    def bar(self, symbol, i):
+        return (symbol, pd.Timestamp(self.dates[i]), self.close[symbol][i])
+
+    def window(self, symbol, N=1):
+        if symbol not in self.close:
+            raise KeyError(symbol)
+        first = self.first[symbol]
+        r = range(first, max(self.cursor, first))[-N:]
+        return BarWindow(self, symbol, r.start, r.stop)
+
+    def frame(self, symbol):
+        columns = {name: column[:self.length] for name, column in self.columns[symbol].items()}
+        return pd.DataFrame(columns, index=pd.DatetimeIndex(self.dates, name='Date'))
+
+    def baseline(self):
+        dataframe = pd.DataFrame(self.prices, index=pd.DatetimeIndex(self.dates, name='Date'), columns=self.symbol_list)
+        return (1.0 + dataframe.pct_change()).cumprod()
+
+def create_bar_store(symbol_list, frames, dtype=np.float64, scale=None):
+    index = {}
+    columns = {}
+    for symbol in symbol_list:
+        df = frames[symbol]
+        index[symbol] = df.index
+        columns[symbol] = {col: compact_column(col, df[col].to_numpy(dtype=np.float64), dtype, scale) for col in df.columns if col != 'Close'}
+
+    prices = forward_fill(np.column_stack([frames[symbol]['Close'].to_numpy(dtype=np.float64) for symbol in symbol_list]))
+    for j, symbol in enumerate(symbol_list):
+        columns[symbol]['Close'] = prices[:, j]
+
+    return BarStore(symbol_list, index, columns, prices)
+
+MIN_HISTORY = 2
+
+class BarStream:
+    # Readers yield (dates, closes, values) chunks, with one column of values
+    # per name in columns, e.g. the open, high, low and volume of each bar.
+    def __init__(self, symbol_list, readers, capacity=None, columns=()):
+        self.symbol_list = symbol_list
+        self.readers = readers
+        self.length = None
+        self.names = list(columns)
+
+        self.capacity = 0
+        self.prices = np.empty((0, len(symbol_list)))
+        self.values = np.empty((0, len(symbol_list), len(self.names)))
+        self.dates = np.empty(0, dtype='datetime64[ns]')
+        self.first = {symbol: 0 for symbol in symbol_list}
+        self.cursor = 0
+        # Without a capacity the buffer only grows to fit the windows that
+        # are subscribed to.
+        self._resize(capacity if capacity is not None else 2 * MIN_HISTORY)
+
+        self.chunks = {}
+        self.heads = []
+        for j, symbol in enumerate(symbol_list):
+            self._next_chunk(j)
+
+    def _next_chunk(self, j):
+        symbol = self.symbol_list[j]
+        for dates, closes, values in self.readers[symbol]:
+            if len(dates) > 0:
+                self.chunks[symbol] = (dates, closes, values, 0)
+                heapq.heappush(self.heads, (dates[0], j))
+                return
+        self.chunks[symbol] = None
+
+    def _resize(self, capacity):
+        # Half the buffer is kept when it fills up, which bounds how far back
+        # a window can reach.
+        prices = np.full((capacity, len(self.symbol_list)), np.nan)
+        values = np.full((capacity, len(self.symbol_list), len(self.names)), np.nan)
+        dates = np.empty(capacity, dtype='datetime64[ns]')
+        prices[:self.cursor] = self.prices[:self.cursor]
+        values[:self.cursor] = self.values[:self.cursor]
+        dates[:self.cursor] = self.dates[:self.cursor]
+        for symbol in self.symbol_list:
+            if self.first[symbol] == self.capacity:
+                self.first[symbol] = capacity
+
+        self.capacity = capacity
+        self.history = capacity // 2
+        self.prices = prices
+        self.values = values
+        self.dates = dates
+        self.time = {symbol: self.dates for symbol in self.symbol_list}
+        self.close = {symbol: self.prices[:, j] for j, symbol in enumerate(self.symbol_list)}
+        self.columns = {symbol: {'Close': self.close[symbol]} for symbol in self.symbol_list}
+        for j, symbol in enumerate(self.symbol_list):
+            for k, name in enumerate(self.names):
+                self.columns[symbol][name] = self.values[:, j, k]
+
+    def reserve(self, N):
+        # Compacting copies the last history bars once every history bars,
+        # so it stays constant time per bar.
+        if N > self.history:
+            self._resize(2 * N)
+
+    def _compact(self):
+        shift = self.cursor - self.history
+        self.prices[:self.history] = self.prices[shift:self.cursor]
+        self.values[:self.history] = self.values[shift:self.cursor]
+        self.dates[:self.history] = self.dates[shift:self.cursor]
+        self.cursor = self.history
+        for symbol in self.symbol_list:
+            if self.first[symbol] < self.capacity:
+                self.first[symbol] = max(self.first[symbol] - shift, 0)
+
+    def advance(self):
+        if len(self.heads) == 0:
+            return False
+        if self.cursor == self.capacity:
+            self._compact()
+
+        row = self.cursor
+        date = self.heads[0][0]
+        if row > 0:
+            self.prices[row] = self.prices[row - 1]
+            self.values[row] = self.values[row - 1]
+        self.dates[row] = date
+
+        while len(self.heads) > 0 and self.heads[0][0] == date:
+            _, j = heapq.heappop(self.heads)
+            symbol = self.symbol_list[j]
+            dates, closes, values, i = self.chunks[symbol]
+            while i < len(dates) and dates[i] == date:
+                self.values[row, j] = values[i]
+                if closes[i] == closes[i]:
+                    self.prices[row, j] = closes[i]
+                    if self.first[symbol] == self.capacity:
+                        self.first[symbol] = row
+                i += 1
+
+            if i < len(dates):
+                self.chunks[symbol] = (dates, closes, values, i)
+                heapq.heappush(self.heads, (dates[i], j))
+            else:
+                self._next_chunk(j)
+
+        self.cursor += 1
+        return True
+
+    def append(self, datetime, prices, values=None):
+        # A bar pushed from a live feed rather than read. Symbols without a
+        # price keep their last one, and their other columns with it.
+        if self.cursor == self.capacity:
+            self._compact()
+
+        row = self.cursor
+        self.prices[row] = prices
+        self.values[row] = values if values is not None else np.nan
+        if row > 0:
+            missing = np.isnan(self.prices[row])
+            self.prices[row, missing] = self.prices[row - 1, missing]
+            self.values[row, missing] = self.values[row - 1, missing]
+        self.dates[row] = datetime
+        for j, symbol in enumerate(self.symbol_list):
+            if self.first[symbol] == self.capacity and self.prices[row, j] == self.prices[row, j]:
+                self.first[symbol] = row
+        self.cursor += 1
+
+    def latest(self):
+        if self.cursor == 0:
+            return None, None
+        return self.dates[self.cursor - 1], self.prices[self.cursor - 1]
+
+    def seek(self, datetime):
+        # The files can only be read forwards, so the bars before datetime are
+        # read but nothing is done with them.
+        while (self.cursor == 0 or self.dates[self.cursor - 1] < datetime) and self.advance():
+            pass
+        if self.cursor == 0 or self.dates[self.cursor - 1] != datetime:
+            raise ValueError("There is no bar at {0}.".format(datetime))
+
+    def bar(self, symbol, i):
+        return (symbol, pd.Timestamp(self.dates[i]), self.close[symbol][i])
+
+    def window(self, symbol, N=1):
+        if symbol not in self.close:
+            raise KeyError(symbol)
+        first = self.first[symbol]
+        r = range(first, max(self.cursor, first))[-N:]
+        return BarWindow(self, symbol, r.start, r.stop)
+
 class HistoricCSVDataHandler(DataHandler):
-    def __init__(self, events, csv_dir, symbol_list, source=DataSource.NASDAQ):
+    def __init__(self, events, csv_dir, symbol_list, source=DataSource.NASDAQ, cache=None, dtype=np.float64, scale=None):
         self.events = events
         self.csv_dir = csv_dir
         self.symbol_list = symbol_list
+        self.cache = cache
+        self.dtype = dtype
+        self.scale = scale
 
         self.symbol_data = {}
-        self.symbol_dataframe = {}
-        self.latest_symbol_data = {}
-        self.all_data = {}
         self.continue_backtest = True
 
         self.time_col = 1
@@ -43,58 +391,55 @@ class HistoricCSVDataHandler(DataHandler):
     def _open_convert_csv_files(self, source):
         combined_index = None
         for symbol in self.symbol_list:
-            if source == DataSource.NASDAQ:
-                self.parse_nasdaq_csv(symbol)
-            else:
-                self.parse_yahoo_csv(symbol)
+            self._load_csv(symbol, source)
 
             if combined_index is None:
                 combined_index = self.symbol_data[symbol].index
             else:
-                combined_index.union(self.symbol_data[symbol].index)
+                combined_index = combined_index.union(self.symbol_data[symbol].index)
 
-            self.latest_symbol_data[symbol] = []
+        frames = {symbol: self.symbol_data[symbol].reindex(index=combined_index, method='pad') for symbol in self.symbol_list}
+        self.bars = create_bar_store(self.symbol_list, frames, self.dtype, self.scale)
+        # The bars are all that is kept of the parsed frames.
+        self.symbol_data = {}
 
-        for symbol in self.symbol_list:
-            self.symbol_dataframe[symbol] = self.symbol_data[symbol].reindex(index=combined_index, method='pad')
-            self.all_data[symbol] = self.symbol_dataframe[symbol].copy()
-            self.symbol_data[symbol] = self.symbol_dataframe[symbol].iterrows()
+    @property
+    def all_data(self):
+        return {symbol: self.bars.frame(symbol) for symbol in self.symbol_list}
 
-    def _get_new_data(self, symbol):
-        for row in self.symbol_data[symbol]:
-            yield tuple([symbol, row[0], row[1][0]])
+    @property
+    def latest_symbol_data(self):
+        return {symbol: self.bars.window(symbol, N=0) for symbol in self.symbol_list}
 
     def get_latest_data(self, symbol, N=1):
         try:
-            return self.latest_symbol_data[symbol][-N:]
+            return self.bars.window(symbol, N)
         except KeyError:
-            print("{symbol} is not a valid symbol.").format(symbol=symbol)
+            print("{symbol} is not a valid symbol.".format(symbol=symbol))
 
     def update_latest_data(self):
-        for symbol in self.symbol_list:
-            data = None
-            try:
-                data = next(self._get_new_data(symbol))
-            except StopIteration:
-                self.continue_backtest = False
-            if data is not None:
-                self.latest_symbol_data[symbol].append(data)
+        if not self.bars.advance():
+            self.continue_backtest = False
 
-        self.events.put(MarketEvent())
+        self.events.put(MarketEvent(*self.bars.latest()))
 
     def create_baseline_dataframe(self):
-        dataframe = None
-        for symbol in self.symbol_list:
-            df = self.symbol_dataframe[symbol]
-            if dataframe == None:
-                dataframe = pd.DataFrame(df['Close'])
-                dataframe.columns = [symbol]
-            else:
-                dataframe[symbol] = pd.DataFrame(df['Close'])
-            dataframe[symbol] = dataframe[symbol].pct_change()
-            dataframe[symbol] = (1.0 + dataframe[symbol]).cumprod()
+        return self.bars.baseline()
+
+    def _load_csv(self, symbol, source):
+        path = os.path.join(self.csv_dir, symbol + '.csv')
+        if self.cache is not None:
+            self.symbol_data[symbol] = self.cache.load(path, source)
+            if self.symbol_data[symbol] is not None:
+                return
 
-        return dataframe
+        if source == DataSource.NASDAQ:
+            self.parse_nasdaq_csv(symbol)
+        else:
+            self.parse_yahoo_csv(symbol)
+
+        if self.cache is not None:
+            self.cache.store(path, source, self.symbol_data[symbol])
 
     def parse_yahoo_csv(self, symbol):
         self.symbol_data[symbol] = pd.read_csv(os.path.join(self.csv_dir, symbol + '.csv'), header=0, index_col=0, parse_dates=True)
@@ -103,17 +448,143 @@ class HistoricCSVDataHandler(DataHandler):
         tmp = pd.read_csv(os.path.join(self.csv_dir, symbol + '.csv'), header=0, index_col=0, parse_dates=True).iloc[::-1]
         self.symbol_data[symbol] = pd.DataFrame(tmp['Closing price'])
         self.symbol_data[symbol].columns = ['Close']
-        # self.symbol_data[symbol]['Open'] = tmp['Closing price']
-        # self.symbol_data[symbol]['High'] = tmp['High price']
-        # self.symbol_data[symbol]['Low'] = tmp['Low price']
-        self.symbol_data[symbol]['Close'] = tmp['Closing price']
-        # self.symbol_data[symbol]['Adj Close'] = tmp['Closing price']
-        # self.symbol_data[symbol]['Volume'] = tmp['Total volume']
+        # Nasdaq exports have no opening price.
+        self.symbol_data[symbol]['High'] = tmp['High price']
+        self.symbol_data[symbol]['Low'] = tmp['Low price']
+        self.symbol_data[symbol]['Volume'] = tmp['Total volume']
+        self.symbol_data[symbol]['Turnover'] = tmp['Turnover']
         self.symbol_data[symbol] = self.symbol_data[symbol][self.symbol_data[symbol]['Close'] > 0.0]
 
+# The columns streamed besides the date and the close, by their name in the
+# file and in the bars.
+STREAM_COLUMNS = {
+    DataSource.NASDAQ: {'High price': 'High', 'Low price': 'Low', 'Total volume': 'Volume', 'Turnover': 'Turnover'},
+    DataSource.YAHOO: {'Open': 'Open', 'High': 'High', 'Low': 'Low', 'Adj Close': 'Adj Close', 'Volume': 'Volume'},
+}
+
+class StreamingCSVDataHandler(DataHandler):
+    def __init__(self, events, csv_dir, symbol_list, source=DataSource.NASDAQ, chunksize=10000, capacity=None):
+        self.events = events
+        self.csv_dir = csv_dir
+        self.symbol_list = symbol_list
+
+        self.continue_backtest = True
+
+        self.time_col = 1
+        self.price_col = 2
+
+        readers = {symbol: self._read_csv(symbol, source, chunksize) for symbol in self.symbol_list}
+        self.bars = BarStream(self.symbol_list, readers, capacity, STREAM_COLUMNS[source].values())
+
+    def _read_csv(self, symbol, source, chunksize):
+        path = os.path.join(self.csv_dir, symbol + '.csv')
+        columns = list(STREAM_COLUMNS[source])
+        if source == DataSource.NASDAQ:
+            # Nasdaq exports are newest first and are read from the end.
+            for dates, closes, values in read_csv_chunks(path, 'Date', 'Closing price', descending=True, chunksize=chunksize, columns=columns):
+                positive = closes > 0.0
+                yield dates[positive], closes[positive], values[positive]
+        else:
+            yield from read_csv_chunks(path, 'Date', 'Close', chunksize=chunksize, columns=columns)
+
+    @property
+    def latest_symbol_data(self):
+        return {symbol: self.bars.window(symbol, N=0) for symbol in self.symbol_list}
+
+    def get_latest_data(self, symbol, N=1):
+        try:
+            return self.bars.window(symbol, N)
+        except KeyError:
+            print("{symbol} is not a valid symbol.".format(symbol=symbol))
+
+    def update_latest_data(self):
+        if not self.bars.advance():
+            self.continue_backtest = False
+
+        self.events.put(MarketEvent(*self.bars.latest()))
+
+    def create_baseline_dataframe(self):
+        # Past bars are not kept, so there is no baseline to compare with.
+        return pd.DataFrame()
+
+class LiveDataHandler(DataHandler):
+    # Bars arrive from a feed through push and are handed out one at a time
+    # by update_latest_data, into a buffer of capacity rows.
+    def __init__(self, events, symbol_list, capacity=None):
+        self.events = events
+        self.symbol_list = symbol_list
+
+        self.continue_backtest = True
+
+        self.time_col = 1
+        self.price_col = 2
+
+        self.bars = BarStream(self.symbol_list, {symbol: iter(()) for symbol in self.symbol_list}, capacity)
+        self.pending = deque()
+
+    def push(self, datetime, prices):
+        self.pending.append((datetime, prices))
+
+    def close(self):
+        self.continue_backtest = False
+
+    @property
+    def latest_symbol_data(self):
+        return {symbol: self.bars.window(symbol, N=0) for symbol in self.symbol_list}
+
+    def get_latest_data(self, symbol, N=1):
+        try:
+            return self.bars.window(symbol, N)
+        except KeyError:
+            print("{symbol} is not a valid symbol.".format(symbol=symbol))
+
+    def update_latest_data(self):
+        if len(self.pending) == 0:
+            return False
+        self.bars.append(*self.pending.popleft())
+        self.events.put(MarketEvent(*self.bars.latest()))
+        return True
+
+    def create_baseline_dataframe(self):
+        return pd.DataFrame()
+
+class ArrayDataHandler(DataHandler):
+    def __init__(self, events, symbol_list, index, columns, prices=None):
+        self.events = events
+        self.symbol_list = symbol_list
+
+        self.all_data = {}
+        self.continue_backtest = True
+
+        self.time_col = 1
+        self.price_col = 2
+
+        self.bars = BarStore(self.symbol_list, index, columns, prices)
+        for symbol in self.symbol_list:
+            self.all_data[symbol] = pd.DataFrame(columns[symbol], index=index[symbol], copy=False)
+
+    @property
+    def latest_symbol_data(self):
+        return {symbol: self.bars.window(symbol, N=0) for symbol in self.symbol_list}
+
+    def get_latest_data(self, symbol, N=1):
+        try:
+            return self.bars.window(symbol, N)
+        except KeyError:
+            print("{symbol} is not a valid symbol.".format(symbol=symbol))
+
+    def update_latest_data(self):
+        if not self.bars.advance():
+            self.continue_backtest = False
+
+        self.events.put(MarketEvent(*self.bars.latest()))
+
+    def create_baseline_dataframe(self):
+        dataframe = pd.DataFrame({symbol: self.all_data[symbol]['Close'] for symbol in self.symbol_list})
+        return (1.0 + dataframe.pct_change()).cumprod()
+
 class QuandlDataHandler(DataHandler):
-    def __init__(self, events, symbol_list, api_key, start_date='2000-01-01', end_date=None):
-        quandl.ApiConfig.api_key = api_key
+    def __init__(self, events, symbol_list, api_key, start_date='2000-01-01', end_date=None, client=None, store=None, max_workers=4, offline=False, dtype=np.float64, scale=None):
         self.events = events
         self.symbol_list = symbol_list
         self.start_date = start_date
@@ -121,10 +592,15 @@ class QuandlDataHandler(DataHandler):
         if self.end_date == None:
             self.end_date = datetime.today().strftime('%Y-%m-%d')
 
+        if client is None and not offline:
+            client = QuandlClient(api_key)
+        if store is None:
+            store = SeriesStore()
+        self.fetcher = SeriesFetcher(client, store, max_workers=max_workers, offline=offline)
+        self.dtype = dtype
+        self.scale = scale
+
         self.symbol_data = {}
-        self.symbol_dataframe = {}
-        self.latest_symbol_data = {}
-        self.all_data = {}
         self.continue_backtest = True
 
         self.time_col = 1
@@ -133,61 +609,47 @@ class QuandlDataHandler(DataHandler):
         self._load_convert_quandl_data()
 
     def _load_convert_quandl_data(self):
+        fetched = self.fetcher.fetch_all(self.symbol_list, self.start_date, self.end_date)
         combined_index = None
         for symbol in self.symbol_list:
-            self._get_nasdaq_data(symbol)
+            self._get_nasdaq_data(symbol, fetched[symbol])
 
             if combined_index is None:
                 combined_index = self.symbol_data[symbol].index
             else:
-                combined_index.union(self.symbol_data[symbol].index)
+                combined_index = combined_index.union(self.symbol_data[symbol].index)
 
-            self.latest_symbol_data[symbol] = []
+        frames = {symbol: self.symbol_data[symbol].reindex(index=combined_index, method='pad') for symbol in self.symbol_list}
+        self.bars = create_bar_store(self.symbol_list, frames, self.dtype, self.scale)
+        # The bars are all that is kept of the parsed frames.
+        self.symbol_data = {}
 
-        for symbol in self.symbol_list:
-            self.symbol_dataframe[symbol] = self.symbol_data[symbol].reindex(index=combined_index, method='pad')
-            self.all_data[symbol] = self.symbol_dataframe[symbol].copy()
-            self.symbol_data[symbol] = self.symbol_dataframe[symbol].iterrows()
+    @property
+    def all_data(self):
+        return {symbol: self.bars.frame(symbol) for symbol in self.symbol_list}
 
-    def _get_new_data(self, symbol):
-        for row in self.symbol_data[symbol]:
-            yield tuple([symbol, row[0], row[1][0]])
+    @property
+    def latest_symbol_data(self):
+        return {symbol: self.bars.window(symbol, N=0) for symbol in self.symbol_list}
 
     def get_latest_data(self, symbol, N=1):
         try:
-            return self.latest_symbol_data[symbol][-N:]
+            return self.bars.window(symbol, N)
         except KeyError:
-            print("{symbol} is not a valid symbol.").format(symbol=symbol)
+            print("{symbol} is not a valid symbol.".format(symbol=symbol))
 
     def update_latest_data(self):
-        for symbol in self.symbol_list:
-            data = None
-            try:
-                data = next(self._get_new_data(symbol))
-            except StopIteration:
-                self.continue_backtest = False
-            if data is not None:
-                self.latest_symbol_data[symbol].append(data)
+        if not self.bars.advance():
+            self.continue_backtest = False
 
-        self.events.put(MarketEvent())
+        self.events.put(MarketEvent(*self.bars.latest()))
 
     def create_baseline_dataframe(self):
-        dataframe = None
-        for symbol in self.symbol_list:
-            df = self.symbol_dataframe[symbol]
-            if dataframe == None:
-                dataframe = pd.DataFrame(df['Close'])
-                dataframe.columns = [symbol]
-            else:
-                dataframe[symbol] = pd.DataFrame(df['Close'])
-            dataframe[symbol] = dataframe[symbol].pct_change()
-            dataframe[symbol] = (1.0 + dataframe[symbol]).cumprod()
+        return self.bars.baseline()
 
-        return dataframe
-
-    def _get_nasdaq_data(self, symbol):
-        self.symbol_data[symbol] = quandl.get('NASDAQOMX/' + symbol, start_date=self.start_date, end_date=self.end_date)
-        self.symbol_data[symbol].drop(columns=['High', 'Low', 'Total Market Value', 'Dividend Market Value'], inplace=True)
-        self.symbol_data[symbol].columns = ['Close']
+    def _get_nasdaq_data(self, symbol, data):
+        self.symbol_data[symbol] = data.copy()
+        self.symbol_data[symbol].drop(columns=['Total Market Value', 'Dividend Market Value'], inplace=True)
+        self.symbol_data[symbol].columns = [name if name in ('High', 'Low') else 'Close' for name in self.symbol_data[symbol].columns]
         self.symbol_data[symbol].index.names = ['Date']
         self.symbol_data[symbol] = self.symbol_data[symbol][self.symbol_data[symbol]['Close'] > 0.0]
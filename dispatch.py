@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+import queue
+import sys
+import time
+
+from collections import deque
+from event import MarketEvent, SignalEvent, OrderEvent, FillEvent
+
+class EventQueue:
+    # Single-threaded stand-in for queue.Queue: no locks, same put/get API.
+    def __init__(self):
+        self.deque = deque()
+        self.put = self.deque.append
+
+    def get(self, block=False):
+        try:
+            return self.deque.popleft()
+        except IndexError:
+            raise queue.Empty
+
+    def empty(self):
+        return len(self.deque) == 0
+
+    def qsize(self):
+        return len(self.deque)
+
+def _handler_name(handler):
+    return getattr(handler, '__qualname__', repr(handler))
+
+class EventDispatcher:
+    def __init__(self, events, profiler=None):
+        self.events = events
+        self.profiler = profiler
+        self.handlers = {}
+        self._resolved = {}
+        self.dispatched = 0
+
+    def register(self, event_class, handler):
+        self.handlers.setdefault(event_class, []).append(handler)
+        self._resolved = {}
+
+    def _handlers_for(self, event_class):
+        handlers = []
+        for cls in event_class.__mro__:
+            handlers.extend(self.handlers.get(cls, []))
+        self._resolved[event_class] = handlers
+        return handlers
+
+    def _qsize(self):
+        if isinstance(self.events, EventQueue):
+            return len(self.events.deque)
+        return self.events.qsize()
+
+    def _dispatch_profiled(self):
+        profiler = self.profiler
+        clock = profiler.clock
+        dispatched = 0
+        while True:
+            try:
+                event = self.events.get(block=False)
+            except queue.Empty:
+                break
+            # Depth of the queue as the event was taken off it.
+            profiler.record_depth(self._qsize() + 1)
+            if event is None:
+                continue
+            handlers = self._resolved.get(event.__class__)
+            if handlers is None:
+                handlers = self._handlers_for(event.__class__)
+
+            start = clock()
+            for handler in handlers:
+                handler_start = clock()
+                handler(event)
+                profiler.record_handler(event.type, _handler_name(handler), clock() - handler_start)
+            profiler.record_event(event.type, clock() - start)
+            dispatched += 1
+
+        self.dispatched += dispatched
+        return dispatched
+
+    def dispatch_pending(self):
+        if self.profiler is not None:
+            return self._dispatch_profiled()
+
+        resolved = self._resolved
+        dispatched = 0
+        if isinstance(self.events, EventQueue):
+            pending = self.events.deque
+            popleft = pending.popleft
+            while pending:
+                event = popleft()
+                if event is None:
+                    continue
+                handlers = resolved.get(event.__class__)
+                if handlers is None:
+                    handlers = self._handlers_for(event.__class__)
+                for handler in handlers:
+                    handler(event)
+                dispatched += 1
+        else:
+            while True:
+                try:
+                    event = self.events.get(block=False)
+                except queue.Empty:
+                    break
+                if event is None:
+                    continue
+                handlers = resolved.get(event.__class__)
+                if handlers is None:
+                    handlers = self._handlers_for(event.__class__)
+                for handler in handlers:
+                    handler(event)
+                dispatched += 1
+
+        self.dispatched += dispatched
+        return dispatched
+
+def create_dispatcher(events, portfolio, strategy, broker, profiler=None):
+    dispatcher = EventDispatcher(events, profiler)
+    # Resting orders are checked against a bar before the strategy sees it.
+    dispatcher.register(MarketEvent, broker.update_bars)
+    dispatcher.register(MarketEvent, strategy.calculate_signals)
+    dispatcher.register(MarketEvent, portfolio.update_timeindex)
+    dispatcher.register(SignalEvent, portfolio.update_signal)
+    dispatcher.register(OrderEvent, broker.execute_order)
+    dispatcher.register(FillEvent, portfolio.update_fill)
+    return dispatcher
+
+def _noop(event):
+    pass
+
+def _benchmark_bus(events, bars):
+    dispatcher = EventDispatcher(events)
+    for event_class in (MarketEvent, SignalEvent, OrderEvent, FillEvent):
+        dispatcher.register(event_class, _noop)
+
+    market = MarketEvent()
+    signal = SignalEvent('SYN', None, 'LONG', 1.0)
+    order = OrderEvent('SYN', 'MKT', 1, 'BUY')
+    fill = FillEvent(None, 'SYN', 'ARCA', 1, 'BUY', 0.0)
+    start = time.perf_counter()
+    for _ in range(bars):
+        events.put(market)
+        events.put(signal)
+        events.put(order)
+        events.put(fill)
+        dispatcher.dispatch_pending()
+    return dispatcher.dispatched, time.perf_counter() - start
+
+def _benchmark_backtest(events, bars, index, columns):
+    from data import ArrayDataHandler
+    from execution import SimulateExecutionHandler
+    from loop import run
+    from portfolio import NaivePortfolio
+    from strategies.hold import BuyAndHoldStrategy
+
+    data = ArrayDataHandler(events, ['SYN'], index, columns)
+    portfolio = NaivePortfolio(data, events, '', initial_capital=100000.0)
+    strategy = BuyAndHoldStrategy(data, events, portfolio)
+    broker = SimulateExecutionHandler(events)
+    start = time.perf_counter()
+    dispatcher = run(events, data, portfolio, strategy, broker)
+    return dispatcher.dispatched, time.perf_counter() - start
+
+def benchmark(bars=1000000):
+    rng = np.random.default_rng(0)
+    index = {'SYN': pd.date_range('2000-01-01', periods=bars, freq='min', name='Date')}
+    columns = {'SYN': {'Close': 100.0 * np.exp(np.cumsum(rng.normal(0.0, 0.001, bars)))}}
+
+    results = {}
+    for name, create_queue in [('queue.Queue', queue.Queue), ('EventQueue', EventQueue)]:
+        for run_name, count, elapsed in [('bus', *_benchmark_bus(create_queue(), bars)),
+                                         ('backtest', *_benchmark_backtest(create_queue(), bars, index, columns))]:
+            results[(name, run_name)] = count / elapsed
+            print("{0} {1}: {2} events in {3:.2f}s, {4:,.0f} events/s".format(name, run_name, count, elapsed, results[(name, run_name)]))
+
+    for run_name in ['bus', 'backtest']:
+        print("Speed-up {0}: {1:.2f}x".format(run_name, results[('EventQueue', run_name)] / results[('queue.Queue', run_name)]))
+    return results
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
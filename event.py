@@ -1,32 +1,60 @@
+def calculate_ib_commission(quantity, fill_cost):
+    full_cost = 1.3
+    if quantity <= 500:
+        full_cost = max(1.3, 0.013 * quantity)
+    else:
+        full_cost = max(1.3, 0.008 * quantity)
+    full_cost = min(full_cost, 0.5 / 100.0 * quantity * fill_cost)
+    return full_cost
+
 class Event:
-    pass
+    __slots__ = ()
 
 class MarketEvent(Event):
-    def __init__(self):
-        self.type = 'MARKET'
+    __slots__ = ('datetime', 'prices')
+    type = 'MARKET'
+
+    def __init__(self, datetime=None, prices=None):
+        self.datetime = datetime
+        self.prices = prices
 
 class SignalEvent(Event):
-    def __init__(self, symbol, datetime, signal_type, quantity):
-        self.type = 'SIGNAL'
+    __slots__ = ('symbol', 'datetime', 'signal_type', 'quantity', 'order_type', 'limit_price', 'stop_price', 'order_id')
+    type = 'SIGNAL'
+
+    def __init__(self, symbol, datetime, signal_type, quantity, order_type='MKT', limit_price=None, stop_price=None, order_id=None):
         self.symbol = symbol
         self.datetime = datetime
         self.signal_type = signal_type
         self.quantity = quantity
+        self.order_type = order_type
+        self.limit_price = limit_price
+        self.stop_price = stop_price
+        self.order_id = order_id
 
 class OrderEvent(Event):
-    def __init__(self, symbol, order_type, quantity, direction):
-        self.type = 'ORDER'
+    # order_type is MKT, LMT, STP, STP LMT or CANCEL. An order with the
+    # order_id of a resting order replaces it.
+    __slots__ = ('symbol', 'order_type', 'quantity', 'direction', 'limit_price', 'stop_price', 'order_id')
+    type = 'ORDER'
+
+    def __init__(self, symbol, order_type, quantity, direction, limit_price=None, stop_price=None, order_id=None):
         self.symbol = symbol
         self.order_type = order_type
         self.quantity = quantity
         self.direction = direction
+        self.limit_price = limit_price
+        self.stop_price = stop_price
+        self.order_id = order_id
 
     def print_order(self):
-        print("Order: Symbol={0}, Type={1}, Quantity={2}, Direction={3}").format(self.symbol, self.order_type, self.quantity, self.direction)
+        print("Order: Symbol={0}, Type={1}, Quantity={2}, Direction={3}".format(self.symbol, self.order_type, self.quantity, self.direction))
 
 class FillEvent(Event):
+    __slots__ = ('timeindex', 'symbol', 'exchange', 'quantity', 'direction', 'fill_cost', 'commission')
+    type = 'FILL'
+
     def __init__(self, timeindex, symbol, exchange, quantity, direction, fill_cost, commission=None):
-        self.type = 'FILL'
         self.timeindex = timeindex
         self.symbol = symbol
         self.exchange = exchange
@@ -40,10 +68,5 @@ class FillEvent(Event):
             self.commission = commission
 
     def calculate_ib_commission(self):
-        full_cost = 1.3
-        if self.quantity <= 500:
-            full_cost = max(1.3, 0.013 * self.quantity)
-        else:
-            full_cost = max(1.3, 0.008 * self.quantity)
-        full_cost = min(full_cost, 0.5 / 100.0 * self.quantity * self.fill_cost)
-        return full_cost
+        return calculate_ib_commission(self.quantity, self.fill_cost)
+
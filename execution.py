@@ -1,21 +1,311 @@
-import queue
+import heapq
+import math
 
+from collections import deque
 from datetime import datetime
 from abc import ABCMeta, abstractmethod
-from event import FillEvent, OrderEvent
+from event import FillEvent
 
 class ExecutionHandler(metaclass=ABCMeta):
+    # Whether LMT, STP and STP LMT orders rest at the broker until their bar.
+    resting_orders = False
+
     @abstractmethod
     def execute_order(self, event):
         raise NotImplementedError
 
+    def update_bars(self, event):
+        pass
+
 class SimulateExecutionHandler(ExecutionHandler):
     def __init__(self, events, verbose=False):
         self.events = events
         self.verbose = verbose
 
     def execute_order(self, event):
+        # Orders fill at once, so there is nothing to cancel, and orders that
+        # would have to rest are refused rather than filled at the market.
         if event.type == 'ORDER':
+            if event.order_type == 'CANCEL':
+                return
+            if event.order_type != 'MKT':
+                raise ValueError("SimulateExecutionHandler only fills MKT orders, got {0}; use BarExecutionHandler for resting orders.".format(event.order_type))
             if self.verbose: print("Order Executed:", event.symbol, event.quantity, event.direction)
             fill_event = FillEvent(datetime.utcnow(), event.symbol, 'ARCA', event.quantity, event.direction, 0)
             self.events.put(fill_event)
+
+class SlippageModel(metaclass=ABCMeta):
+    @abstractmethod
+    def adjust(self, price, direction, quantity, bar):
+        raise NotImplementedError
+
+class NoSlippage(SlippageModel):
+    def adjust(self, price, direction, quantity, bar):
+        return price
+
+class FixedSlippage(SlippageModel):
+    # Buys pay and sells receive the price moved by a fraction of itself.
+    def __init__(self, rate=0.0005):
+        self.rate = rate
+
+    def adjust(self, price, direction, quantity, bar):
+        return price * (1.0 + self.rate) if direction == 'BUY' else price * (1.0 - self.rate)
+
+class VolumeSlippage(SlippageModel):
+    # The price impact grows with the square of the share of the bar's volume.
+    def __init__(self, impact=0.1, rate=0.0):
+        self.impact = impact
+        self.rate = rate
+
+    def adjust(self, price, direction, quantity, bar):
+        share = quantity / bar.volume if bar.volume == bar.volume and bar.volume > 0 else 0.0
+        slippage = self.rate + self.impact * share ** 2
+        return price * (1.0 + slippage) if direction == 'BUY' else price * (1.0 - slippage)
+
+class FillModel(metaclass=ABCMeta):
+    @abstractmethod
+    def capacity(self, bar):
+        raise NotImplementedError
+
+class FullFill(FillModel):
+    def capacity(self, bar):
+        return math.inf
+
+class VolumeShareFill(FillModel):
+    # At most max_share of a bar's volume is filled, the rest of an order
+    # waits for the following bars. Bars without volume fill in full.
+    def __init__(self, max_share=0.1):
+        self.max_share = max_share
+
+    def capacity(self, bar):
+        if bar.volume != bar.volume:
+            return math.inf
+        return math.floor(self.max_share * bar.volume)
+
+class Bar:
+    __slots__ = ('datetime', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, datetime, open, high, low, close, volume):
+        self.datetime = datetime
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+class RestingOrder:
+    __slots__ = ('symbol', 'order_type', 'direction', 'remaining', 'limit_price', 'stop_price', 'order_id', 'active')
+
+    def __init__(self, event):
+        self.symbol = event.symbol
+        self.order_type = event.order_type
+        self.direction = event.direction
+        self.remaining = event.quantity
+        # A negative quantity trades the other way, as the simple handler does.
+        if self.remaining < 0:
+            self.direction = 'SELL' if self.direction == 'BUY' else 'BUY'
+            self.remaining = -self.remaining
+        self.limit_price = event.limit_price
+        self.stop_price = event.stop_price
+        self.order_id = event.order_id
+        self.active = True
+
+class OrderBook:
+    # Limits and stops are kept in heaps keyed so that the order closest to
+    # triggering is on top, which makes checking a bar O(log n) per fill.
+    def __init__(self):
+        self.buy_limits = []
+        self.sell_limits = []
+        self.buy_stops = []
+        self.sell_stops = []
+        self.market = deque()
+        self.sequence = 0
+        self.cancelled = 0
+
+    def __len__(self):
+        return len(self.buy_limits) + len(self.sell_limits) + len(self.buy_stops) + len(self.sell_stops) + len(self.market)
+
+    def add(self, order):
+        self.sequence += 1
+        if order.order_type == 'MKT':
+            self.market.append(order)
+        elif order.order_type == 'LMT':
+            if order.direction == 'BUY':
+                heapq.heappush(self.buy_limits, (-order.limit_price, self.sequence, order))
+            else:
+                heapq.heappush(self.sell_limits, (order.limit_price, self.sequence, order))
+        elif order.direction == 'BUY':
+            heapq.heappush(self.buy_stops, (order.stop_price, self.sequence, order))
+        else:
+            heapq.heappush(self.sell_stops, (-order.stop_price, self.sequence, order))
+
+    def cancel(self):
+        # Cancelled orders are dropped lazily as they reach the top of a heap,
+        # or all at once when they make up most of the book.
+        self.cancelled += 1
+        if self.cancelled > 64 and 2 * self.cancelled > len(self):
+            for heap in (self.buy_limits, self.sell_limits, self.buy_stops, self.sell_stops):
+                heap[:] = [entry for entry in heap if entry[2].active]
+                heapq.heapify(heap)
+            self.market = deque(order for order in self.market if order.active)
+            self.cancelled = 0
+
+    def _pop_while(self, heap, triggered):
+        orders = []
+        while len(heap) > 0 and (not heap[0][2].active or triggered(heap[0][0])):
+            order = heapq.heappop(heap)[2]
+            if order.active:
+                orders.append(order)
+        return orders
+
+    def triggered_stops(self, bar):
+        return self._pop_while(self.buy_stops, lambda stop: bar.high >= stop) + self._pop_while(self.sell_stops, lambda stop: bar.low <= -stop)
+
+    def triggered_limits(self, bar):
+        return self._pop_while(self.buy_limits, lambda limit: bar.low <= -limit) + self._pop_while(self.sell_limits, lambda limit: bar.high >= limit)
+
+class BarExecutionHandler(ExecutionHandler):
+    resting_orders = True
+
+    def __init__(self, events, data, slippage=None, fill_model=None, exchange='ARCA', verbose=False):
+        self.events = events
+        self.data = data
+        self.slippage = slippage if slippage is not None else NoSlippage()
+        self.fill_model = fill_model if fill_model is not None else FullFill()
+        self.exchange = exchange
+        self.verbose = verbose
+
+        self.books = {}
+        self.orders = {}
+        self.capacity = {}
+
+    def _column(self, symbol, name, i):
+        column = self.data.bars.columns[symbol].get(name)
+        return column[i] if column is not None else math.nan
+
+    def get_bar(self, symbol):
+        bars = self.data.bars
+        i = bars.cursor - 1
+        if i < 0 or bars.close[symbol][i] != bars.close[symbol][i]:
+            return None
+        close = bars.close[symbol][i]
+
+        # Missing or zero prices fall back to the close, and a missing open
+        # to the previous close.
+        open = self._column(symbol, 'Open', i)
+        if not open > 0:
+            open = bars.close[symbol][i - 1] if i > 0 and bars.close[symbol][i - 1] > 0 else close
+        high = self._column(symbol, 'High', i)
+        low = self._column(symbol, 'Low', i)
+        high = max(high, open, close) if high > 0 else max(open, close)
+        low = min(low, open, close) if low > 0 else min(open, close)
+        return Bar(bars.dates[i], open, high, low, close, self._column(symbol, 'Volume', i))
+
+    def _fill(self, order, bar, price):
+        capacity = self.capacity.get(order.symbol)
+        if capacity is None:
+            capacity = self.capacity[order.symbol] = self.fill_model.capacity(bar)
+        quantity = min(order.remaining, capacity)
+        if quantity <= 0:
+            return
+
+        price = self.slippage.adjust(price, order.direction, quantity, bar)
+        if order.order_type == 'LMT':
+            price = min(price, order.limit_price) if order.direction == 'BUY' else max(price, order.limit_price)
+
+        self.capacity[order.symbol] = capacity - quantity
+        order.remaining -= quantity
+        if order.remaining <= 0:
+            order.active = False
+            if order.order_id is not None and self.orders.get(order.order_id) is order:
+                del self.orders[order.order_id]
+
+        if self.verbose: print("Order Executed:", order.symbol, quantity, order.direction, price)
+        self.events.put(FillEvent(bar.datetime, order.symbol, self.exchange, quantity, order.direction, price))
+
+    def _limit_price(self, order, bar):
+        if order.direction == 'BUY':
+            return bar.open if bar.open <= order.limit_price else order.limit_price
+        return bar.open if bar.open >= order.limit_price else order.limit_price
+
+    def _stop_price(self, order, bar):
+        if order.direction == 'BUY':
+            return bar.open if bar.open >= order.stop_price else order.stop_price
+        return bar.open if bar.open <= order.stop_price else order.stop_price
+
+    def _rest(self, order):
+        book = self.books.get(order.symbol)
+        if book is None:
+            book = self.books[order.symbol] = OrderBook()
+        book.add(order)
+
+    def update_bars(self, event):
+        if event.type == 'MARKET':
+            self.capacity = {}
+            for symbol, book in self.books.items():
+                if len(book) == 0:
+                    continue
+                bar = self.get_bar(symbol)
+                if bar is None:
+                    continue
+
+                pending = []
+                for i in range(len(book.market)):
+                    order = book.market.popleft()
+                    if order.active:
+                        self._fill(order, bar, bar.open)
+                        pending.append(order)
+
+                for order in book.triggered_stops(bar):
+                    if order.order_type == 'STP':
+                        self._fill(order, bar, self._stop_price(order, bar))
+                        pending.append(order)
+                        continue
+
+                    # A triggered stop-limit becomes a limit order. On the same
+                    # bar it fills where the stop triggered if that is within
+                    # the limit, or else at the limit if the bar reaches it.
+                    order.order_type = 'LMT'
+                    price = self._stop_price(order, bar)
+                    if order.direction == 'BUY':
+                        reached = bar.low <= order.limit_price
+                        within = price <= order.limit_price
+                    else:
+                        reached = bar.high >= order.limit_price
+                        within = price >= order.limit_price
+                    if within or reached:
+                        self._fill(order, bar, price if within else order.limit_price)
+                        pending.append(order)
+                    else:
+                        book.add(order)
+
+                for order in book.triggered_limits(bar):
+                    self._fill(order, bar, self._limit_price(order, bar))
+                    pending.append(order)
+
+                # Partly filled orders rest again, the stops as market orders.
+                for order in pending:
+                    if order.active:
+                        if order.order_type == 'STP':
+                            order.order_type = 'MKT'
+                        book.add(order)
+
+    def execute_order(self, event):
+        if event.type == 'ORDER':
+            previous = self.orders.pop(event.order_id, None) if event.order_id is not None else None
+            if previous is not None:
+                previous.active = False
+                self.books[previous.symbol].cancel()
+            if event.order_type == 'CANCEL':
+                return
+
+            order = RestingOrder(event)
+            if order.order_id is not None:
+                self.orders[order.order_id] = order
+
+            if order.order_type == 'MKT':
+                bar = self.get_bar(order.symbol)
+                if bar is not None:
+                    self._fill(order, bar, bar.close)
+            if order.active:
+                self._rest(order)
@@ -0,0 +1,105 @@
+import os
+import os.path
+import pandas as pd
+import pickle
+import tempfile
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+class QuandlClient:
+    def __init__(self, api_key, database='NASDAQOMX'):
+        import quandl
+        quandl.ApiConfig.api_key = api_key
+        self.quandl = quandl
+        self.database = database
+
+    def get(self, symbol, start_date, end_date):
+        return self.quandl.get(self.database + '/' + symbol, start_date=start_date, end_date=end_date)
+
+class SeriesStore:
+    def __init__(self, store_dir='.quandl/'):
+        self.store_dir = store_dir
+
+    def _path(self, symbol):
+        return os.path.join(self.store_dir, symbol + '.pkl')
+
+    def load(self, symbol):
+        try:
+            with open(self._path(symbol), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def save(self, symbol, entry):
+        os.makedirs(self.store_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix='.', dir=self.store_dir)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(symbol))
+
+class SeriesFetcher:
+    def __init__(self, client, store, max_workers=4, retries=3, backoff=1.0, offline=False, verbose=False):
+        self.client = client
+        self.store = store
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.offline = offline
+        self.verbose = verbose
+
+    def _get(self, symbol, start_date, end_date):
+        for attempt in range(self.retries + 1):
+            try:
+                return self.client.get(symbol, start_date, end_date)
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+                if self.verbose: print("Fetching {0} failed ({1}), retrying in {2}s".format(symbol, e, delay))
+                time.sleep(delay)
+
+    def _missing_ranges(self, entry, start_date, end_date):
+        if entry is None:
+            return [(start_date, end_date)]
+
+        ranges = []
+        if start_date < entry['start_date']:
+            ranges.append((start_date, entry['start_date']))
+        # The last stored day is fetched again since it may have been incomplete.
+        if end_date >= entry['end_date']:
+            ranges.append((entry['end_date'], end_date))
+        return ranges
+
+    def fetch(self, symbol, start_date, end_date):
+        start_date = pd.Timestamp(start_date)
+        end_date = pd.Timestamp(end_date)
+        entry = self.store.load(symbol)
+        if self.offline:
+            if entry is None:
+                raise KeyError("{0} is not in the local store.".format(symbol))
+            return entry['data'].loc[start_date:end_date]
+
+        frames = [entry['data']] if entry is not None else []
+        try:
+            for missing_start, missing_end in self._missing_ranges(entry, start_date, end_date):
+                frames.append(self._get(symbol, missing_start.strftime('%Y-%m-%d'), missing_end.strftime('%Y-%m-%d')))
+        except Exception:
+            if entry is None:
+                raise
+            if self.verbose: print("Using stored data for {0}".format(symbol))
+            return entry['data'].loc[start_date:end_date]
+
+        data = pd.concat(frames)
+        data = data[~data.index.duplicated(keep='last')].sort_index()
+        stored_start, stored_end = start_date, end_date
+        if entry is not None:
+            stored_start, stored_end = min(start_date, entry['start_date']), max(end_date, entry['end_date'])
+        self.store.save(symbol, {'data': data, 'start_date': stored_start, 'end_date': stored_end})
+
+        return data.loc[start_date:end_date]
+
+    def fetch_all(self, symbol_list, start_date, end_date):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {symbol: executor.submit(self.fetch, symbol, start_date, end_date) for symbol in symbol_list}
+            return {symbol: future.result() for symbol, future in futures.items()}
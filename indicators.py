@@ -0,0 +1,155 @@
+import math
+import pandas as pd
+
+from abc import ABCMeta, abstractmethod
+from collections import deque
+
+class Indicator(metaclass=ABCMeta):
+    @abstractmethod
+    def update(self, value):
+        raise NotImplementedError
+
+class EMA(Indicator):
+    # Same recursion as pandas' ewm(span=span, adjust=False).mean(), so
+    # values are bit-for-bit identical to the full-history computation.
+    # With a window the EMA is re-seeded on the oldest bar in the window,
+    # like ewm over series.tail(window).
+    def __init__(self, span, min_periods=0, window=None):
+        self.span = span
+        self.min_periods = max(min_periods, 1)
+        self.window = window
+
+        com = (span - 1) / 2.0
+        self.alpha = 1.0 / (1.0 + com)
+        self.old_weight_factor = 1.0 - self.alpha
+        self.window_decay = self.old_weight_factor ** (window - 1) if window is not None else 0.0
+
+        self.weighted = math.nan
+        self.old_weight = 1.0
+        self.count = 0
+        self.residuals = deque(maxlen=window) if window is not None else None
+        self.value = math.nan
+
+    def update(self, value):
+        observed = value == value
+        if self.weighted == self.weighted:
+            self.old_weight *= self.old_weight_factor
+            if observed:
+                if self.weighted != value:
+                    self.weighted = self.old_weight * self.weighted + self.alpha * value
+                    self.weighted /= self.old_weight + self.alpha
+                self.old_weight = 1.0
+        elif observed:
+            self.weighted = value
+        self.count += observed
+        if observed and self.residuals is not None:
+            self.residuals.append(value - self.weighted)
+
+        if self.count < self.min_periods:
+            self.value = math.nan
+        elif self.residuals is None or len(self.residuals) < self.window:
+            self.value = self.weighted
+        else:
+            self.value = self.weighted + self.window_decay * self.residuals[0]
+
+        return self.value
+
+class SMA(Indicator):
+    def __init__(self, period, min_periods=None):
+        self.period = period
+        self.min_periods = period if min_periods is None else min_periods
+        self.values = deque(maxlen=period)
+        self.total = 0.0
+        self.updates = 0
+        self.value = math.nan
+
+    def update(self, value):
+        if len(self.values) == self.period:
+            self.total -= self.values[0]
+        self.values.append(value)
+        self.total += value
+
+        # Recompute the running sum once per period to stop rounding drift.
+        self.updates += 1
+        if self.updates == self.period:
+            self.total = math.fsum(self.values)
+            self.updates = 0
+
+        n = len(self.values)
+        self.value = self.total / n if n >= self.min_periods else math.nan
+        return self.value
+
+class RollingStd(Indicator):
+    def __init__(self, period, min_periods=None, ddof=1):
+        self.period = period
+        self.min_periods = period if min_periods is None else min_periods
+        self.ddof = ddof
+        self.values = deque(maxlen=period)
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.updates = 0
+        self.value = math.nan
+
+    def update(self, value):
+        if len(self.values) == self.period:
+            old = self.values[0]
+            n = len(self.values) - 1
+            if n == 0:
+                self.mean = 0.0
+                self.m2 = 0.0
+            elif n == 1:
+                self.mean = self.values[1]
+                self.m2 = 0.0
+            else:
+                delta = old - self.mean
+                self.mean -= delta / n
+                self.m2 -= delta * (old - self.mean)
+        self.values.append(value)
+
+        n = len(self.values)
+        delta = value - self.mean
+        self.mean += delta / n
+        self.m2 += delta * (value - self.mean)
+
+        # Recompute the mean and the squared deviations once per period to
+        # stop rounding drift.
+        self.updates += 1
+        if self.updates == self.period:
+            self.mean = math.fsum(self.values) / n
+            self.m2 = math.fsum((v - self.mean) ** 2 for v in self.values)
+            self.updates = 0
+
+        if n >= max(self.min_periods, self.ddof + 1):
+            self.value = math.sqrt(max(self.m2, 0.0) / (n - self.ddof))
+        else:
+            self.value = math.nan
+        return self.value
+
+class MACD(Indicator):
+    def __init__(self, fast_period=12, slow_period=26, signal_period=9):
+        self.fast = EMA(fast_period)
+        self.slow = EMA(slow_period)
+        self.signal_ema = EMA(signal_period)
+        self.macd = math.nan
+        self.signal = math.nan
+        self.histogram = math.nan
+        self.value = math.nan
+
+    def update(self, value):
+        self.macd = self.fast.update(value) - self.slow.update(value)
+        self.signal = self.signal_ema.update(self.macd)
+        self.histogram = self.macd - self.signal
+        self.value = self.macd
+        return self.macd
+
+def calculate_ema(values, span, min_periods=0, window=None):
+    series = pd.Series(values, dtype='float64')
+    if window is None:
+        return series.ewm(span=span, min_periods=min_periods, adjust=False).mean().to_numpy()
+
+    weighted = series.ewm(span=span, adjust=False).mean()
+    residuals = (series - weighted).shift(window - 1)
+    ema = (weighted + EMA(span, window=window).window_decay * residuals).to_numpy(copy=True)
+    ema[:window - 1] = weighted.to_numpy()[:window - 1]
+    ema[:max(min_periods, 1) - 1] = math.nan
+    return ema
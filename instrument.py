@@ -0,0 +1,100 @@
+import json
+import time
+
+HISTOGRAM_BUCKETS = 48
+
+class LatencyHistogram:
+    # Bucket k counts latencies below 2**k nanoseconds.
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+
+    def add(self, nanoseconds):
+        self.count += 1
+        self.total += nanoseconds
+        if self.min is None or nanoseconds < self.min:
+            self.min = nanoseconds
+        if nanoseconds > self.max:
+            self.max = nanoseconds
+        self.buckets[min(nanoseconds.bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+
+    def percentile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for k, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(2 ** k, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {'count': self.count,
+                'total_ns': self.total,
+                'mean_ns': self.total / self.count if self.count > 0 else None,
+                'min_ns': self.min,
+                'max_ns': self.max,
+                'p50_ns': self.percentile(0.5),
+                'p99_ns': self.percentile(0.99),
+                'histogram': {'<{0}ns'.format(2 ** k): n for k, n in enumerate(self.buckets) if n > 0}}
+
+class LoopProfiler:
+    def __init__(self):
+        self.events = {}
+        self.handlers = {}
+        self.queue_depth = {}
+        self.bars = LatencyHistogram()
+        self.data = LatencyHistogram()
+        self.clock = time.perf_counter_ns
+
+    def _histogram(self, table, key):
+        histogram = table.get(key)
+        if histogram is None:
+            histogram = table[key] = LatencyHistogram()
+        return histogram
+
+    def record_depth(self, depth):
+        self.queue_depth[depth] = self.queue_depth.get(depth, 0) + 1
+
+    def record_event(self, event_type, nanoseconds):
+        self._histogram(self.events, event_type).add(nanoseconds)
+
+    def record_handler(self, event_type, handler, nanoseconds):
+        self._histogram(self.handlers, (event_type, handler)).add(nanoseconds)
+
+    def to_dict(self):
+        samples = sum(self.queue_depth.values())
+        return {'bars': self.bars.to_dict(),
+                'update_latest_data': self.data.to_dict(),
+                'events': {event_type: histogram.to_dict() for event_type, histogram in self.events.items()},
+                'handlers': [dict(event=event_type, handler=handler, **histogram.to_dict()) for (event_type, handler), histogram in self.handlers.items()],
+                'queue_depth': {'max': max(self.queue_depth) if samples > 0 else 0,
+                                'mean': sum(depth * n for depth, n in self.queue_depth.items()) / samples if samples > 0 else 0,
+                                'histogram': {str(depth): n for depth, n in sorted(self.queue_depth.items())}}}
+
+    def to_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def collapsed_stacks(self):
+        # Folded stacks in microseconds, the input format of flamegraph.pl
+        # and speedscope. Time spent in the loop itself shows as 'run'.
+        lines = ['run;update_latest_data {0}'.format(self.data.total // 1000)]
+        for event_type, histogram in self.events.items():
+            handled = 0
+            for (handler_event, handler), handler_histogram in self.handlers.items():
+                if handler_event == event_type:
+                    lines.append('run;dispatch;{0};{1} {2}'.format(event_type, handler, handler_histogram.total // 1000))
+                    handled += handler_histogram.total
+            lines.append('run;dispatch;{0} {1}'.format(event_type, (histogram.total - handled) // 1000))
+        events = sum(histogram.total for histogram in self.events.values())
+        lines.append('run {0}'.format(max(self.bars.total - self.data.total - events, 0) // 1000))
+        return [line for line in lines if not line.endswith(' 0')]
+
+    def to_collapsed(self, path):
+        with open(path, 'w') as f:
+            f.write("\n".join(self.collapsed_stacks()) + "\n")
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+class Ledger:
+    def __init__(self, columns, capacity=None, dtype=np.float64):
+        self.columns = list(columns)
+        self.capacity = max(capacity or 1024, 1)
+        self.values = np.zeros((self.capacity, len(self.columns)), dtype=dtype)
+        self.index = np.empty(self.capacity, dtype='datetime64[ns]')
+        self.length = 0
+
+    def _grow(self):
+        self.capacity *= 2
+        values = np.zeros((self.capacity, len(self.columns)), dtype=self.values.dtype)
+        values[:self.length] = self.values[:self.length]
+        index = np.empty(self.capacity, dtype='datetime64[ns]')
+        index[:self.length] = self.index[:self.length]
+        self.values = values
+        self.index = index
+
+    def next_row(self, datetime):
+        if self.length == self.capacity:
+            self._grow()
+        # Storing a Timestamp's datetime64 directly skips a slow conversion.
+        self.index[self.length] = getattr(datetime, 'asm8', datetime)
+        self.length += 1
+        return self.values[self.length - 1]
+
+    def append(self, datetime, row):
+        self.next_row(datetime)[:] = row
+
+    def __getstate__(self):
+        # Only the rows in use are saved, which keeps checkpoints small.
+        state = self.__dict__.copy()
+        rows = max(self.length, 1)
+        state['values'] = self.values[:rows].copy()
+        state['index'] = self.index[:rows].copy()
+        state['capacity'] = rows
+        return state
+
+    def __len__(self):
+        return self.length
+
+    def dates(self):
+        return self.index[:self.length]
+
+    def column(self, name):
+        return self.values[:self.length, self.columns.index(name)]
+
+    def to_frame(self, index_name='datetime'):
+        index = pd.DatetimeIndex(self.index[:self.length], name=index_name)
+        return pd.DataFrame(self.values[:self.length], index=index, columns=self.columns, copy=False)
+
+    def to_records(self, index_name='datetime'):
+        records = []
+        for i in range(self.length):
+            record = dict(zip(self.columns, self.values[i].tolist()))
+            record[index_name] = pd.Timestamp(self.index[i])
+            records.append(record)
+        return records
@@ -0,0 +1,262 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import numpy as np
+import pandas as pd
+import sys
+import time
+
+from data import LiveDataHandler
+from dispatch import EventQueue, create_dispatcher
+from event import FillEvent
+from execution import ExecutionHandler
+from instrument import LatencyHistogram
+
+# The feed and the simulated market speak a line protocol:
+#   BAR <datetime> <symbol>=<price> ...                           market to client
+#   ORDER <id> <symbol> <quantity> <BUY|SELL>                     client to market
+#   FILL <id> <datetime> <symbol> <quantity> <BUY|SELL> <price>   market to client
+#   END                                                           market to client
+
+def format_bar(datetime, symbols, prices):
+    quotes = ' '.join('{0}={1!r}'.format(symbol, float(price)) for symbol, price in zip(symbols, prices) if price == price)
+    return 'BAR {0} {1}\n'.format(pd.Timestamp(datetime).isoformat(), quotes)
+
+def parse_bar(fields, columns):
+    prices = np.full(len(columns), np.nan)
+    for quote in fields[2:]:
+        symbol, _, price = quote.partition('=')
+        j = columns.get(symbol)
+        if j is not None:
+            prices[j] = float(price)
+    return np.datetime64(fields[1], 'ns'), prices
+
+class LiveLatency:
+    def __init__(self, clock=time.perf_counter_ns):
+        self.clock = clock
+        self.bar_received = None
+        self.bar_to_order = LatencyHistogram()
+        self.bar_to_handled = LatencyHistogram()
+        self.order_to_fill = LatencyHistogram()
+
+    def to_dict(self):
+        return {'bar_to_order': self.bar_to_order.to_dict(),
+                'bar_to_handled': self.bar_to_handled.to_dict(),
+                'order_to_fill': self.order_to_fill.to_dict()}
+
+class SocketExecutionHandler(ExecutionHandler):
+    # Orders are written to the market by tasks of their own, so the strategy
+    # never waits on the socket. Fills come back through run_live.
+    def __init__(self, events, writer, latency=None, exchange='SIM'):
+        self.events = events
+        self.writer = writer
+        self.latency = latency if latency is not None else LiveLatency()
+        self.exchange = exchange
+        self.sent = {}
+        self.tasks = set()
+        self.order_id = 0
+        self.unsupported = set()
+
+    async def _submit(self, line):
+        self.writer.write(line.encode())
+        await self.writer.drain()
+
+    def execute_order(self, event):
+        if event.type == 'ORDER':
+            if event.order_type != 'MKT':
+                if event.order_type not in self.unsupported:
+                    self.unsupported.add(event.order_type)
+                    print("Order type {0} is not supported by the market, such orders are dropped.".format(event.order_type), file=sys.stderr)
+                return
+            quantity = event.quantity
+            direction = event.direction
+            if quantity < 0:
+                quantity = -quantity
+                direction = 'SELL' if direction == 'BUY' else 'BUY'
+            if quantity == 0:
+                return
+
+            self.order_id += 1
+            now = self.latency.clock()
+            self.sent[self.order_id] = now
+            if self.latency.bar_received is not None:
+                self.latency.bar_to_order.add(now - self.latency.bar_received)
+
+            task = asyncio.get_running_loop().create_task(self._submit('ORDER {0} {1} {2!r} {3}\n'.format(self.order_id, event.symbol, float(quantity), direction)))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    def outstanding(self):
+        return len(self.sent)
+
+    def update_fill(self, fields):
+        order_id = int(fields[1])
+        sent = self.sent.pop(order_id, None)
+        if sent is not None:
+            self.latency.order_to_fill.add(self.latency.clock() - sent)
+        self.events.put(FillEvent(pd.Timestamp(fields[2]), fields[3], self.exchange, float(fields[4]), fields[5], float(fields[6])))
+
+    async def flush(self):
+        if len(self.tasks) > 0:
+            await asyncio.gather(*self.tasks)
+
+async def run_live(lines, data, portfolio, strategy, broker, events, latency=None):
+    # Handlers run to completion on each message, so a bar is handled, and
+    # its orders are sent, before the next line is read.
+    dispatcher = create_dispatcher(events, portfolio, strategy, broker)
+    columns = {symbol: j for j, symbol in enumerate(data.symbol_list)}
+    clock = latency.clock if latency is not None else time.perf_counter_ns
+    outstanding = getattr(broker, 'outstanding', None)
+    ended = False
+
+    async for line in lines:
+        received = clock()
+        fields = line.decode().split()
+        if len(fields) == 0:
+            continue
+        if fields[0] == 'BAR':
+            if latency is not None:
+                latency.bar_received = received
+            data.push(*parse_bar(fields, columns))
+            while data.update_latest_data():
+                dispatcher.dispatch_pending()
+            if latency is not None:
+                latency.bar_to_handled.add(clock() - received)
+        elif fields[0] == 'FILL':
+            broker.update_fill(fields)
+            dispatcher.dispatch_pending()
+        elif fields[0] == 'END':
+            ended = True
+
+        # Orders sent on the last bars are still filled after the feed ends.
+        if ended and (outstanding is None or outstanding() == 0):
+            break
+
+    data.close()
+    if hasattr(broker, 'flush'):
+        await broker.flush()
+    return dispatcher
+
+async def tail_lines(path, poll=0.05):
+    # Follows a file that a feed appends to, like tail -f.
+    with open(path, 'rb') as f:
+        partial = b''
+        while True:
+            line = f.readline()
+            if len(line) == 0:
+                await asyncio.sleep(poll)
+                continue
+            partial += line
+            if partial.endswith(b'\n'):
+                yield partial
+                partial = b''
+
+class SimulatedMarket:
+    # A local stand-in for a broker: every client is sent the bars one by one
+    # and its market orders are filled at the latest price.
+    def __init__(self, frames, interval=0.01, host='127.0.0.1', port=0):
+        self.symbols = list(frames.keys())
+        index = frames[self.symbols[0]].index
+        for symbol in self.symbols[1:]:
+            index = index.union(frames[symbol].index)
+        self.dates = index.values
+        self.prices = np.column_stack([frames[symbol]['Close'].reindex(index).to_numpy(dtype=np.float64) for symbol in self.symbols])
+        self.interval = interval
+        self.host = host
+        self.port = port
+        self.server = None
+        self.clients = set()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        # Clients that are still connected are served to the end first.
+        self.server.close()
+        if len(self.clients) > 0:
+            await asyncio.gather(*self.clients, return_exceptions=True)
+        await self.server.wait_closed()
+
+    async def _fill_orders(self, reader, writer, state):
+        columns = {symbol: j for j, symbol in enumerate(self.symbols)}
+        async for line in reader:
+            fields = line.decode().split()
+            if len(fields) == 5 and fields[0] == 'ORDER':
+                price = state['prices'][columns[fields[2]]]
+                writer.write('FILL {0} {1} {2} {3} {4} {5!r}\n'.format(fields[1], pd.Timestamp(state['datetime']).isoformat(), fields[2], fields[3], fields[4], float(price)).encode())
+                await writer.drain()
+
+    async def _serve(self, reader, writer):
+        client = asyncio.current_task()
+        self.clients.add(client)
+        last = np.full(len(self.symbols), np.nan)
+        state = {'datetime': None, 'prices': last}
+        orders = asyncio.get_running_loop().create_task(self._fill_orders(reader, writer, state))
+        try:
+            for i in range(len(self.dates)):
+                prices = self.prices[i]
+                state['datetime'] = self.dates[i]
+                np.copyto(last, prices, where=~np.isnan(prices))
+                writer.write(format_bar(self.dates[i], self.symbols, prices).encode())
+                await writer.drain()
+                await asyncio.sleep(self.interval)
+            writer.write(b'END\n')
+            await writer.drain()
+            await orders
+        except ConnectionError:
+            orders.cancel()
+        finally:
+            writer.close()
+            self.clients.discard(client)
+
+async def paper_trade(frames, strategy_class, parameters, interval=0.001, initial_capital=100000.0):
+    from portfolio import NaivePortfolio
+
+    market = await SimulatedMarket(frames, interval).start()
+    try:
+        reader, writer = await asyncio.open_connection(market.host, market.port)
+        events = EventQueue()
+        data = LiveDataHandler(events, market.symbols)
+        portfolio = NaivePortfolio(data, events, '', initial_capital=initial_capital)
+        strategy = strategy_class(data, events, portfolio, **parameters)
+        portfolio.strategy_name = strategy.name
+        latency = LiveLatency()
+        broker = SocketExecutionHandler(events, writer, latency)
+        await run_live(reader, data, portfolio, strategy, broker, events, latency)
+        writer.close()
+        await writer.wait_closed()
+    finally:
+        await market.stop()
+
+    return portfolio, latency
+
+def main(argv=None):
+    from benchmark import generate_ohlcv
+    from loop import STRATEGIES, DEFAULT_PARAMETERS, parse_parameter
+
+    parser = argparse.ArgumentParser(description='Paper trade a strategy against a simulated market feed.')
+    parser.add_argument('--strategy', choices=sorted(STRATEGIES.keys()), default='ma-long')
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=VALUE')
+    parser.add_argument('--symbols', type=int, default=20)
+    parser.add_argument('--bars', type=int, default=1000)
+    parser.add_argument('--interval', type=float, default=0.001)
+    parser.add_argument('--initial-capital', type=float, default=100000.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    parameters = dict(DEFAULT_PARAMETERS.get(args.strategy, {}))
+    parameters.update(parse_parameter(parameter) for parameter in args.param)
+    frames = generate_ohlcv(args.bars, args.symbols, seed=args.seed)
+    # The stats go to stdout as JSON, and the trades strategies print to stderr.
+    with contextlib.redirect_stdout(sys.stderr):
+        portfolio, latency = asyncio.run(paper_trade(frames, STRATEGIES[args.strategy], parameters, args.interval, args.initial_capital))
+
+    stats = {name: float(value) for name, value in portfolio.calculate_stats().items()}
+    print(json.dumps({'stats': stats, 'latency': latency.to_dict()}, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,72 +1,323 @@
+import argparse
+import ast
+import contextlib
+import json
+import os.path
+import pandas as pd
 import queue
+import re
+import subprocess
+import sys
 import time
-import config
 from datetime import datetime
 from event import MarketEvent, SignalEvent, OrderEvent, FillEvent
-from data import QuandlDataHandler, HistoricCSVDataHandler, DataSource
+from data import QuandlDataHandler, HistoricCSVDataHandler, StreamingCSVDataHandler, DataSource
 from strategies.hold import BuyAndHoldStrategy, SellAndHoldStrategy
 from strategies.macd import MovingAveragesLongStrategy, MovingAveragesLongShortStrategy, MovingAveragesMomentumStrategy
 from strategies.stop_loss import StopLossStrategy
 from strategies.divide_conquer import DivideAndConquerStrategy
 from portfolio import NaivePortfolio
-from execution import SimulateExecutionHandler
+from execution import SimulateExecutionHandler, BarExecutionHandler, FixedSlippage, VolumeShareFill
+from dispatch import EventQueue, create_dispatcher
+from instrument import LoopProfiler
+from checkpoint import save_checkpoint, load_checkpoint
+from plotting import Chart, DECIMATORS, render
+
+def run(events, data, portfolio, strategy, broker, profiler=None):
+    dispatcher = create_dispatcher(events, portfolio, strategy, broker, profiler)
+    if profiler is not None:
+        return run_profiled(dispatcher, data, profiler)
 
-def backtest(events, data, portfolio, strategy, broker):
     while True:
         data.update_latest_data()
         if data.continue_backtest == False:
             break
 
-        while True:
-            try:
-                event = events.get(block=False)
-            except queue.Empty:
-                break
-
-            if event is not None:
-                if event.type == 'MARKET':
-                    strategy.calculate_signals(event)
-                    portfolio.update_timeindex(event)
-                elif event.type == 'SIGNAL':
-                    portfolio.update_signal(event)
-                elif event.type == 'ORDER':
-                    broker.execute_order(event)
-                elif event.type == 'FILL':
-                    portfolio.update_fill(event)
+        dispatcher.dispatch_pending()
 
         # time.sleep(10*60)
+
+    return dispatcher
+
+def run_profiled(dispatcher, data, profiler):
+    clock = profiler.clock
+    while True:
+        start = clock()
+        data.update_latest_data()
+        profiler.data.add(clock() - start)
+        if data.continue_backtest == False:
+            break
+
+        dispatcher.dispatch_pending()
+        profiler.bars.add(clock() - start)
+
+    return dispatcher
+
+def run_checkpointed(events, data, portfolio, strategy, broker, path, every=None):
+    dispatcher = create_dispatcher(events, portfolio, strategy, broker)
+    bars = 0
+    while True:
+        data.update_latest_data()
+        if data.continue_backtest == False:
+            break
+
+        dispatcher.dispatch_pending()
+        bars += 1
+        if every is not None and bars % every == 0:
+            save_checkpoint(path, data, events, portfolio, strategy, broker)
+
+    # The data handler repeats the last bar once it runs out, and that
+    # MarketEvent must not be handled again on resume.
+    while not events.empty():
+        events.get(False)
+    save_checkpoint(path, data, events, portfolio, strategy, broker)
+    return dispatcher
+
+def run_many(data, stacks):
+    # One pass over the data for any number of (events, portfolio, strategy,
+    # broker) stacks. Each MarketEvent is handed to every stack in turn, and
+    # the signals, orders and fills it leads to stay on that stack's queue.
+    dispatchers = [create_dispatcher(events, portfolio, strategy, broker) for events, portfolio, strategy, broker in stacks]
+    feed = data.events
+    while True:
+        data.update_latest_data()
+        if data.continue_backtest == False:
+            break
+
+        while not feed.empty():
+            event = feed.get(False)
+            if event is None:
+                continue
+            for dispatcher in dispatchers:
+                dispatcher.events.put(event)
+                dispatcher.dispatch_pending()
+
+    return dispatchers
+
+def compare(data, stacks, names=None):
+    run_many(data, stacks)
+
+    if names is None:
+        names = [portfolio.strategy_name or strategy.name for _, portfolio, strategy, _ in stacks]
+    stats = {}
+    curves = {}
+    for name, (_, portfolio, _, _) in zip(names, stacks):
+        stats[name] = portfolio.calculate_stats()
+        curves[name] = portfolio.equity_curve['equity_curve']
+
+    return pd.DataFrame(stats).T, pd.DataFrame(curves)
+
+def backtest(events, data, portfolio, strategy, broker, plot=True, plot_file=None):
+    run(events, data, portfolio, strategy, broker)
     stats = portfolio.summary_stats()
 
     for stat in stats:
             print(stat[0] + ": " + stat[1])
 
-    strategy.plot()
-    portfolio.plot_all()
-
-# for s in [5, 10, 50, 100, 200]:
-#     for l in [s+10, s+50, s+100, s+200]:
-#         events = queue.Queue()
-#         data = HistoricCSVDataHandler(events, 'csv/', ['OMXS30'], DataSource.NASDAQ)
-#         # data = QuandlDataHandler(events, ['OMXS30'], config.API_KEY)
-#         portfolio = NaivePortfolio(data, events, '', initial_capital=2000)
-#         # strategy = BuyAndHoldStrategy(data, events, portfolio)
-#         # strategy = SellAndHoldStrategy(data, events, portfolio)
-#         # strategy = MovingAveragesLongShortStrategy(data, events, portfolio, 100, 200, version=1)
-#         # strategy = MovingAveragesMomentumStrategy(data, events, portfolio, 100, 200)
-#         # strategy = StopLossStrategy(data, events, portfolio, 0.9)
-#         # strategy = DivideAndConquerStrategy(data, events, portfolio)
-#         strategy = MovingAveragesLongStrategy(data, events, portfolio, s, l, version=2)
-#         portfolio.strategy_name = strategy.name
-#         broker = SimulateExecutionHandler(events)
-#         print('Short: {0}, Long: {1}'.format(s, l))
-#         backtest(events, data, portfolio, strategy, broker)
-#         print('----------')
-
-events = queue.Queue()
-data = HistoricCSVDataHandler(events, 'csv/', ['OMXS30'], DataSource.NASDAQ)
-portfolio = NaivePortfolio(data, events, '', initial_capital=2000)
-strategy = MovingAveragesLongStrategy(data, events, portfolio, 50, 100, version=1)
-portfolio.strategy_name = strategy.name
-broker = SimulateExecutionHandler(events)
-
-backtest(events, data, portfolio, strategy, broker)
\ No newline at end of file
+    if plot:
+        render(strategy.charts() + portfolio.charts(), plot_file)
+
+STRATEGIES = {
+    'buy-and-hold': BuyAndHoldStrategy,
+    'sell-and-hold': SellAndHoldStrategy,
+    'stop-loss': StopLossStrategy,
+    'divide-and-conquer': DivideAndConquerStrategy,
+    'ma-long': MovingAveragesLongStrategy,
+    'ma-long-short': MovingAveragesLongShortStrategy,
+    'ma-momentum': MovingAveragesMomentumStrategy,
+}
+
+DEFAULT_PARAMETERS = {
+    'stop-loss': {'stop_loss_percentage': 0.9},
+    'ma-long': {'short_period': 50, 'long_period': 100},
+    'ma-long-short': {'short_period': 50, 'long_period': 100},
+    'ma-momentum': {'short_period': 50, 'long_period': 100},
+}
+
+IMPORT_TIME_BUDGET = 1.0
+
+def measure_import_time(module='loop'):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module], capture_output=True, text=True)
+    cumulative = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)', line)
+        if match is None:
+            continue
+        modules.add(match.group(4).split('.')[0])
+        if match.group(4) == module:
+            cumulative = int(match.group(2))
+
+    return cumulative / 1e6, modules
+
+def parse_parameter(parameter):
+    name, _, value = parameter.partition('=')
+    try:
+        value = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        pass
+    return name, value
+
+def parse_strategy(spec):
+    # NAME or NAME:PARAM=VALUE,PARAM=VALUE
+    name, _, parameters = spec.partition(':')
+    if name not in STRATEGIES:
+        raise argparse.ArgumentTypeError("unknown strategy {0}".format(name))
+    values = dict(DEFAULT_PARAMETERS.get(name, {}))
+    values.update(parse_parameter(parameter) for parameter in parameters.split(',') if parameter)
+    return spec, name, values
+
+def create_broker(events, data, broker='simulate', slippage=0.0, max_volume_share=None):
+    if broker == 'bar':
+        fill_model = VolumeShareFill(max_volume_share) if max_volume_share is not None else None
+        return BarExecutionHandler(events, data, FixedSlippage(slippage), fill_model)
+    return SimulateExecutionHandler(events)
+
+def check_broker(strategy, broker):
+    # Stops left at the broker need a broker that keeps them in a book.
+    if getattr(strategy, 'broker_stops', False) and not broker.resting_orders:
+        raise SystemExit("{0} with broker_stops needs --broker bar, the simulate broker only fills market orders.".format(strategy.name))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Run an event-driven backtest.')
+    parser.add_argument('--source', choices=['NASDAQ', 'YAHOO', 'QUANDL'], default='NASDAQ')
+    parser.add_argument('--csv-dir', default='csv/')
+    parser.add_argument('--api-key', default=None)
+    parser.add_argument('--stream', action='store_true')
+    parser.add_argument('--symbols', nargs='+', default=['OMXS30'])
+    parser.add_argument('--strategy', choices=sorted(STRATEGIES.keys()), default='ma-long')
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=VALUE')
+    parser.add_argument('--compare', nargs='+', type=parse_strategy, default=None, metavar='STRATEGY[:NAME=VALUE,...]')
+    parser.add_argument('--initial-capital', type=float, default=2000)
+    parser.add_argument('--broker', choices=['simulate', 'bar'], default='simulate')
+    parser.add_argument('--slippage', type=float, default=0.0)
+    parser.add_argument('--max-volume-share', type=float, default=None)
+    parser.add_argument('--format', choices=['text', 'json'], default=None)
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--no-plot', action='store_true')
+    parser.add_argument('--plot-file', default=None, metavar='FILE')
+    parser.add_argument('--plot-method', choices=sorted(DECIMATORS.keys()), default='lttb')
+    parser.add_argument('--thread-safe', action='store_true')
+    parser.add_argument('--checkpoint', default=None, metavar='FILE')
+    parser.add_argument('--checkpoint-every', type=int, default=None, metavar='BARS')
+    parser.add_argument('--resume', action='store_true')
+    parser.add_argument('--profile', default=None, metavar='FILE')
+    parser.add_argument('--profile-collapsed', default=None, metavar='FILE')
+    parser.add_argument('--check-import-time', action='store_true')
+    return parser.parse_args(argv)
+
+def trade_log(args):
+    # Strategies print their trades. While JSON goes to stdout they are sent
+    # to stderr, so the output stays valid JSON.
+    output_format = args.format or ('json' if args.no_plot else 'text')
+    if output_format == 'json' and args.output is None:
+        return contextlib.redirect_stdout(sys.stderr)
+    return contextlib.nullcontext()
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.check_import_time:
+        seconds, modules = measure_import_time()
+        eager = sorted(modules & {'matplotlib', 'quandl', 'config'})
+        print("Import time: {0:.3f}s (budget {1:.3f}s)".format(seconds, IMPORT_TIME_BUDGET))
+        if eager:
+            print("Imported eagerly: " + ', '.join(eager))
+        return 0 if seconds <= IMPORT_TIME_BUDGET and not eager else 1
+
+    events = queue.Queue() if args.thread_safe else EventQueue()
+    if args.source == 'QUANDL':
+        api_key = args.api_key
+        if api_key is None:
+            import config
+            api_key = config.API_KEY
+        data = QuandlDataHandler(events, args.symbols, api_key)
+    elif args.stream:
+        data = StreamingCSVDataHandler(events, args.csv_dir, args.symbols, DataSource(args.source))
+    else:
+        data = HistoricCSVDataHandler(events, args.csv_dir, args.symbols, DataSource(args.source))
+
+    if args.compare is not None:
+        return compare_main(args, data)
+
+    parameters = dict(DEFAULT_PARAMETERS.get(args.strategy, {}))
+    parameters.update(parse_parameter(parameter) for parameter in args.param)
+
+    if args.resume and args.checkpoint is not None and os.path.exists(args.checkpoint):
+        portfolio, strategy, broker = load_checkpoint(args.checkpoint, data, events)
+    else:
+        portfolio = NaivePortfolio(data, events, '', initial_capital=args.initial_capital)
+        strategy = STRATEGIES[args.strategy](data, events, portfolio, **parameters)
+        portfolio.strategy_name = strategy.name
+        broker = create_broker(events, data, args.broker, args.slippage, args.max_volume_share)
+    check_broker(strategy, broker)
+
+    profiler = None
+    if args.profile is not None or args.profile_collapsed is not None:
+        profiler = LoopProfiler()
+    with trade_log(args):
+        if args.checkpoint is not None:
+            run_checkpointed(events, data, portfolio, strategy, broker, args.checkpoint, args.checkpoint_every)
+        else:
+            run(events, data, portfolio, strategy, broker, profiler)
+    if args.profile is not None:
+        profiler.to_json(args.profile)
+    if args.profile_collapsed is not None:
+        profiler.to_collapsed(args.profile_collapsed)
+
+    output_format = args.format or ('json' if args.no_plot else 'text')
+    if output_format == 'json':
+        stats = {name: float(value) for name, value in portfolio.calculate_stats().items()}
+        output = json.dumps({'strategy': args.strategy, 'symbols': args.symbols, 'parameters': parameters, 'stats': stats}, indent=2)
+    else:
+        output = "\n".join(stat[0] + ": " + stat[1] for stat in portfolio.summary_stats())
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if not args.no_plot:
+        render(strategy.charts() + portfolio.charts(), args.plot_file, method=args.plot_method)
+
+    return 0
+
+def compare_main(args, data):
+    stacks = []
+    for spec, name, parameters in args.compare:
+        events = queue.Queue() if args.thread_safe else EventQueue()
+        portfolio = NaivePortfolio(data, events, '', initial_capital=args.initial_capital)
+        strategy = STRATEGIES[name](data, events, portfolio, **parameters)
+        portfolio.strategy_name = strategy.name
+        broker = create_broker(events, data, args.broker, args.slippage, args.max_volume_share)
+        check_broker(strategy, broker)
+        stacks.append((events, portfolio, strategy, broker))
+
+    with trade_log(args):
+        stats, curves = compare(data, stacks, [spec for spec, _, _ in args.compare])
+
+    output_format = args.format or ('json' if args.no_plot else 'text')
+    if output_format == 'json':
+        output = json.dumps({'symbols': args.symbols,
+                             'strategies': [{'strategy': name, 'parameters': parameters, 'stats': {stat: float(value) for stat, value in stats.loc[spec].items()}}
+                                            for spec, name, parameters in args.compare]}, indent=2)
+    else:
+        output = stats.to_string()
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if not args.no_plot:
+        chart = Chart('Equity Curves', ylabel='Equity')
+        for spec in curves.columns:
+            chart.line(spec, curves.index.values, curves[spec].to_numpy())
+        render([chart], args.plot_file, method=args.plot_method)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,19 +1,69 @@
 import numpy as np
-import pandas as pd
+
+def _as_array(values):
+    return np.asarray(values, dtype=np.float64)
 
 def calculate_sharpe_ratio(returns, periods=252):
-    return (np.sqrt(periods) * np.mean(returns)) / np.std(returns)
+    returns = _as_array(returns)
+    return (np.sqrt(periods) * np.nanmean(returns)) / np.nanstd(returns)
+
+def calculate_drawdown_series(equity_curve):
+    # The high-water mark starts at 0 and ignores the first bar, whose
+    # equity is undefined, as the original element-wise loop did.
+    equity = _as_array(equity_curve)
+    n = len(equity)
+    hwm = np.fmax.accumulate(np.concatenate([[0.0], equity[1:]]))
+    drawdown = hwm - equity
+    drawdown[:1] = np.nan
+
+    index = np.arange(n)
+    last_zero = np.maximum.accumulate(np.where(drawdown == 0, index, -1))
+    duration = (index - last_zero).astype(np.float64)
+    duration[last_zero < 0] = np.nan
+
+    return drawdown, duration
+
+def calculate_max_drawdowns(equity_curves):
+    # The max drawdown of each row of curves that begin on the second bar,
+    # with the high-water mark of calculate_drawdown_series. The rows are
+    # overwritten.
+    high_water_mark = np.maximum(np.maximum.accumulate(equity_curves, axis=1), 0.0)
+    return np.subtract(high_water_mark, equity_curves, out=equity_curves).max(axis=1)
 
 def calculate_drawdowns(equity_curve):
-    hwm = [0]
-    eq_index = equity_curve.index
-    drawdown = pd.Series(index=eq_index)
-    duration = pd.Series(index=eq_index)
-
-    for i in range(1, len(eq_index)):
-        current_hwm = max(hwm[i-1], equity_curve[i])
-        hwm.append(current_hwm)
-        drawdown[i] = hwm[i] - equity_curve[i]
-        duration[i] = 0 if drawdown[i] == 0 else duration[i-1] + 1
-
-    return drawdown.max(), duration.max()
+    drawdown, duration = calculate_drawdown_series(equity_curve)
+    if len(drawdown) < 2:
+        return np.nan, np.nan
+    return np.nanmax(drawdown), np.nanmax(duration)
+
+def calculate_performance(returns, equity_curve, periods=252, traded_value=None, total=None):
+    returns = _as_array(returns)
+    equity = _as_array(equity_curve)
+    valid = returns[~np.isnan(returns)]
+    n = len(valid)
+
+    mean = valid.mean() if n > 0 else np.nan
+    std = valid.std() if n > 0 else np.nan
+    downside = np.sqrt(np.mean(np.minimum(valid, 0.0) ** 2)) if n > 0 else np.nan
+    max_dd, dd_duration = calculate_drawdowns(equity)
+
+    total_return = equity[-1] - 1.0 if len(equity) > 0 else np.nan
+    cagr = (equity[-1] ** (periods / n) - 1.0) if n > 0 and equity[-1] > 0 else np.nan
+    nonzero = valid[valid != 0]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stats = {'total_return': total_return,
+                 'cagr': cagr,
+                 'volatility': np.sqrt(periods) * std,
+                 'sharpe_ratio': np.sqrt(periods) * mean / std,
+                 'sortino_ratio': np.sqrt(periods) * mean / downside,
+                 'max_drawdown': max_dd,
+                 'drawdown_duration': dd_duration,
+                 'calmar_ratio': cagr / max_dd,
+                 'hit_rate': np.mean(nonzero > 0) if len(nonzero) > 0 else np.nan,
+                 'turnover': np.nan}
+
+        if traded_value is not None and total is not None and n > 0:
+            stats['turnover'] = np.nansum(_as_array(traded_value)) / np.nanmean(_as_array(total)) * periods / n
+
+    return stats
@@ -0,0 +1,141 @@
+import io
+import numpy as np
+import os.path
+
+WIDTH = 12
+HEIGHT = 4
+DPI = 100
+
+def _positions(x):
+    x = np.asarray(x)
+    if x.dtype.kind == 'M':
+        x = x.astype('datetime64[ns]').view(np.int64)
+    return (x - x[0]).astype(np.float64)
+
+def lttb(x, y, points):
+    # Largest-Triangle-Three-Buckets: the first and the last point, and from
+    # each bucket in between the point that spans the largest triangle with
+    # the point kept before it and the mean of the next bucket.
+    n = len(y)
+    if points >= n or points < 3:
+        return np.arange(n)
+    x = _positions(x)
+    bounds = np.append(np.linspace(1, n - 1, points - 1).astype(np.int64), n)
+    sum_x = np.concatenate(([0.0], np.cumsum(x)))
+    sum_y = np.concatenate(([0.0], np.cumsum(y)))
+
+    indices = np.empty(points, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0
+    for i in range(points - 2):
+        start, end, following = bounds[i], bounds[i + 1], bounds[i + 2]
+        mean_x = (sum_x[following] - sum_x[end]) / (following - end)
+        mean_y = (sum_y[following] - sum_y[end]) / (following - end)
+        area = np.abs((x[a] - mean_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (mean_y - y[a]))
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+def minmax(x, y, points):
+    # The lowest and the highest point of each of points/2 buckets, which
+    # keeps every spike at the cost of a less smooth line.
+    n = len(y)
+    buckets = points // 2
+    if buckets < 1 or 2 * buckets >= n:
+        return np.arange(n)
+    bounds = np.linspace(0, n, buckets + 1).astype(np.int64)
+    sizes = np.diff(bounds)
+    kept = [0, n - 1]
+    for reduce in (np.minimum, np.maximum):
+        extremes = np.flatnonzero(y == np.repeat(reduce.reduceat(y, bounds[:-1]), sizes))
+        _, first = np.unique(np.searchsorted(bounds, extremes, side='right'), return_index=True)
+        kept.append(extremes[first])
+    return np.unique(np.concatenate([np.atleast_1d(k) for k in kept]))
+
+DECIMATORS = {'lttb': lttb, 'minmax': minmax}
+
+def decimate(x, y, points, method='lttb'):
+    # Indices of at most about points points of y that keep its shape.
+    # Missing values are skipped.
+    if method not in DECIMATORS:
+        raise ValueError("Unknown decimation method {0}, expected one of {1}.".format(method, ', '.join(DECIMATORS)))
+    valid = np.flatnonzero(~np.isnan(y))
+    if len(valid) == 0:
+        return valid
+    if valid[-1] - valid[0] + 1 == len(valid):
+        start, stop = valid[0], valid[-1] + 1
+        return start + DECIMATORS[method](x[start:stop], y[start:stop], points)
+    return valid[DECIMATORS[method](x[valid], y[valid], points)]
+
+class Chart:
+    def __init__(self, title, ylabel='Value', xlabel='Time'):
+        self.title = title
+        self.ylabel = ylabel
+        self.xlabel = xlabel
+        self.lines = []
+        self.markers = []
+
+    def line(self, label, x, y, color=None, linewidth=1.0, scale=1.0, offset=0.0):
+        # The line is drawn as y * scale + offset. Decimating is unaffected
+        # by it, so only the points that are drawn are scaled.
+        self.lines.append((label, x, y, color, linewidth, scale, offset))
+
+    def marker(self, label, x, y, marker, color, size=10):
+        self.markers.append((label, x, y, marker, color, size))
+
+def _draw(ax, chart, points, method):
+    for label, x, y, color, linewidth, scale, offset in chart.lines:
+        i = decimate(x, y, points, method)
+        ax.plot(x[i], y[i] * scale + offset, label=label, color=color, linewidth=linewidth)
+    for label, x, y, marker, color, size in chart.markers:
+        ax.plot(x, y, marker, markersize=size, color=color, label=label, linestyle='none')
+
+    ax.set_title(chart.title)
+    ax.set_xlabel(chart.xlabel)
+    ax.set_ylabel(chart.ylabel)
+    if len(chart.lines) + len(chart.markers) > 1:
+        ax.legend()
+
+def _figure(charts, points, method, width, height, dpi):
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(width, height * len(charts)), dpi=dpi)
+    axes = figure.subplots(len(charts), 1, squeeze=False)[:, 0]
+    for ax, chart in zip(axes, charts):
+        _draw(ax, chart, points, method)
+    figure.tight_layout()
+    return figure
+
+def _html(charts, points, method, width, height, dpi):
+    # One inline SVG per chart, so the page needs nothing else to display.
+    parts = ['<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n<title>{0}</title>\n</head>\n<body>\n'.format(charts[0].title)]
+    for chart in charts:
+        svg = io.StringIO()
+        _figure([chart], points, method, width, height, dpi).savefig(svg, format='svg')
+        svg = svg.getvalue()
+        parts.append('<div>\n{0}</div>\n'.format(svg[svg.index('<svg'):]))
+    parts.append('</body>\n</html>\n')
+    return ''.join(parts)
+
+def render(charts, path=None, points=None, method='lttb', width=WIDTH, height=HEIGHT, dpi=DPI):
+    # Without a path every chart is shown in a window of its own. With one
+    # they are written to a PNG, SVG, PDF or HTML file, which needs no
+    # display. Lines are decimated to about one point per pixel column.
+    import matplotlib.style
+
+    if len(charts) == 0:
+        return
+    points = points or int(width * dpi)
+    with matplotlib.style.context('ggplot'):
+        if path is None:
+            import matplotlib.pyplot as plt
+            for chart in charts:
+                figure, ax = plt.subplots(figsize=(width, height), dpi=dpi)
+                _draw(ax, chart, points, method)
+            plt.show()
+        elif os.path.splitext(path)[1].lower() in ('.html', '.htm'):
+            with open(path, 'w') as f:
+                f.write(_html(charts, points, method, width, height, dpi))
+        else:
+            _figure(charts, points, method, width, height, dpi).savefig(path)
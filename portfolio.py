@@ -1,12 +1,10 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import queue
+import numpy as np
 
 from abc import ABCMeta, abstractmethod
-from math import floor
-from matplotlib import style
-from event import FillEvent, OrderEvent
-from performance import calculate_sharpe_ratio, calculate_drawdowns
+from event import OrderEvent
+from ledger import Ledger
+from performance import calculate_performance
+from plotting import Chart, render
 
 class Portfolio(metaclass=ABCMeta):
     @abstractmethod
@@ -25,12 +23,33 @@ class NaivePortfolio(Portfolio):
         self.initial_capital = initial_capital
         self.strategy_name = strategy_name
 
-        self.all_positions = []
+        bar_count = self.data.get_bar_count()
+        self.positions_ledger = Ledger(self.symbol_list, capacity=bar_count)
         self.current_positions = {symbol: 0.0 for symbol in self.symbol_list}
+        self.position_vector = np.zeros(len(self.symbol_list))
+        self.symbol_columns = {symbol: j for j, symbol in enumerate(self.symbol_list)}
 
-        self.all_holdings = []
+        self.holdings_ledger = Ledger(self.symbol_list + ['cash', 'commission', 'total'], capacity=bar_count)
         self.current_holdings = self.construct_current_holdings()
 
+        # The value traded between two bars is recorded as it happens, since
+        # streaming data handlers do not keep past prices.
+        self.traded_ledger = Ledger(['traded'], capacity=bar_count)
+        self.last_positions = np.zeros(len(self.symbol_list))
+        self.last_prices = np.full(len(self.symbol_list), np.nan)
+
+        # Every fill as the symbol's column, the signed quantity, the price
+        # and the commission, dated with the bar it was filled on.
+        self.trades_ledger = Ledger(['symbol', 'quantity', 'price', 'commission'])
+
+    @property
+    def all_positions(self):
+        return self.positions_ledger.to_records()
+
+    @property
+    def all_holdings(self):
+        return self.holdings_ledger.to_records()
+
     def construct_current_holdings(self):
         holdings = {symbol: 0.0 for symbol in self.symbol_list}
         holdings['cash'] = self.initial_capital
@@ -39,25 +58,32 @@ class NaivePortfolio(Portfolio):
         return holdings
 
     def update_timeindex(self, event):
-        data = {symbol: self.data.get_latest_data(symbol) for symbol in self.symbol_list}
-        datetime = data[self.symbol_list[0]][0][self.data.time_col]
-
-        positions = {symbol: self.current_positions[symbol] for symbol in self.symbol_list}
-        positions['datetime'] = datetime
-        self.all_positions.append(positions)
-
-        holdings = {symbol: 0.0 for symbol in self.symbol_list}
-        holdings['datetime'] = datetime
-        holdings['cash'] = self.current_holdings['cash']
-        holdings['commission'] = self.current_holdings['commission']
-        holdings['total'] = self.current_holdings['cash']
-
-        for symbol in self.symbol_list:
-            market_value = self.current_positions[symbol] * data[symbol][0][self.data.price_col]
-            holdings[symbol] = market_value
-            holdings['total'] += market_value
-
-        self.all_holdings.append(holdings)
+        datetime = event.datetime
+        prices = event.prices
+        if prices is None:
+            data = {symbol: self.data.get_latest_data(symbol) for symbol in self.symbol_list}
+            datetime = data[self.symbol_list[0]][0][self.data.time_col]
+            prices = np.array([data[symbol][0][self.data.price_col] for symbol in self.symbol_list])
+
+        n = len(self.symbol_list)
+        traded = 0.0
+        if (self.position_vector != self.last_positions).any():
+            traded = np.nansum(np.abs(self.position_vector - self.last_positions) * self.last_prices)
+        self.traded_ledger.next_row(datetime)[0] = traded
+        self.last_positions[:] = self.position_vector
+        self.last_prices[:] = prices
+
+        self.positions_ledger.next_row(datetime)[:] = self.position_vector
+        holdings = self.holdings_ledger.next_row(datetime)
+        np.multiply(self.position_vector, prices, out=holdings[:n])
+        holdings[n] = self.current_holdings['cash']
+        holdings[n + 1] = self.current_holdings['commission']
+        total = self.position_vector.dot(prices)
+        if total != total:
+            # Symbols that have no price yet cannot be held.
+            np.nan_to_num(holdings[:n], copy=False)
+            total = holdings[:n].sum()
+        holdings[n + 2] = self.current_holdings['cash'] + total
 
     def update_positions_from_fill(self, fill):
         fill_dir = 0
@@ -67,6 +93,7 @@ class NaivePortfolio(Portfolio):
             fill_dir = -1
 
         self.current_positions[fill.symbol] += fill_dir * fill.quantity
+        self.position_vector[self.symbol_columns[fill.symbol]] += fill_dir * fill.quantity
 
     def update_holdings_from_fill(self, fill):
         fill_dir = 0
@@ -75,12 +102,16 @@ class NaivePortfolio(Portfolio):
         elif fill.direction == 'SELL':
             fill_dir = -1
 
-        fill_cost = self.data.get_latest_data(fill.symbol)[0][self.data.price_col]
+        # Brokers that do not report a fill price fill at the latest close.
+        fill_cost = fill.fill_cost
+        if not fill_cost:
+            fill_cost = self.data.get_latest_data(fill.symbol)[0][self.data.price_col]
         cost = fill_cost * fill_dir * fill.quantity
         self.current_holdings[fill.symbol] += cost
         self.current_holdings['commission'] += fill.commission
         self.current_holdings['cash'] -= (cost + fill.commission)
         self.current_holdings['total'] -= (cost + fill.commission)
+        self.trades_ledger.append(self.data.bars.latest()[0], (self.symbol_columns[fill.symbol], fill_dir * fill.quantity, fill_cost, fill.commission))
 
     def update_fill(self, event):
         if event.type == 'FILL':
@@ -96,17 +127,21 @@ class NaivePortfolio(Portfolio):
 
         market_quantity = quantity
         current_quantity = self.current_positions[symbol]
-        order_type = 'MKT'
+        order_type = signal.order_type
+        prices = {'limit_price': signal.limit_price, 'stop_price': signal.stop_price, 'order_id': signal.order_id}
+
+        if order_type == 'CANCEL':
+            return OrderEvent(symbol, order_type, 0, None, **prices)
 
         if direction == 'LONG':
-            order = OrderEvent(symbol, order_type, market_quantity, 'BUY')
+            order = OrderEvent(symbol, order_type, market_quantity, 'BUY', **prices)
         if direction == 'SHORT':
-            order = OrderEvent(symbol, order_type, market_quantity, 'SELL')
+            order = OrderEvent(symbol, order_type, market_quantity, 'SELL', **prices)
 
         if direction == 'EXIT' and current_quantity > 0:
-            order = OrderEvent(symbol, order_type, market_quantity, 'SELL')
+            order = OrderEvent(symbol, order_type, market_quantity, 'SELL', **prices)
         if direction == 'EXIT' and current_quantity < 0:
-            order = OrderEvent(symbol, order_type, market_quantity, 'BUY')
+            order = OrderEvent(symbol, order_type, market_quantity, 'BUY', **prices)
 
         return order
 
@@ -116,49 +151,72 @@ class NaivePortfolio(Portfolio):
             self.events.put(order_event)
 
     def create_equity_curve_dataframe(self):
-        curve = pd.DataFrame(self.all_holdings)
-        curve.set_index('datetime', inplace=True)
+        curve = self.holdings_ledger.to_frame()
         curve['returns'] = curve['total'].pct_change()
         curve['equity_curve'] = (1.0 + curve['returns']).cumprod()
         self.equity_curve = curve
         self.holdings_curve = curve['total']
 
-    def summary_stats(self):
-        self.create_equity_curve_dataframe()
-        total_return = self.equity_curve['equity_curve'][-1]
-        returns = self.equity_curve['returns']
-        pnl = self.equity_curve['equity_curve']
+    def create_trades_dataframe(self):
+        trades = self.trades_ledger.to_frame()
+        trades['symbol'] = [self.symbol_list[j] for j in trades['symbol'].astype(int)]
+        self.trades = trades
+        return trades
 
-        sharpe_ratio = calculate_sharpe_ratio(returns)
-        max_dd, dd_duration = calculate_drawdowns(pnl)
+    def calculate_traded_value(self):
+        # Positions are recorded before the fills of a bar, so a change
+        # between two rows was filled at the close of the earlier one.
+        return self.traded_ledger.values[:len(self.traded_ledger), 0]
 
-        stats = [("Total Return", "%0.2f%%" % ((total_return - 1.0) * 100.0)),
-                ("Sharpe Ratio", "%0.2f" % sharpe_ratio),
-                ("Max Drawdown", "%0.2f%%" % (max_dd * 100.0)),
-                ("Drawdown Duration", "%d" % dd_duration)]
+    def calculate_stats(self):
+        self.create_equity_curve_dataframe()
+        return calculate_performance(self.equity_curve['returns'], self.equity_curve['equity_curve'],
+                                     traded_value=self.calculate_traded_value(), total=self.equity_curve['total'])
+
+    def summary_stats(self):
+        values = self.calculate_stats()
+
+        stats = [("Total Return", "%0.2f%%" % (values['total_return'] * 100.0)),
+                ("CAGR", "%0.2f%%" % (values['cagr'] * 100.0)),
+                ("Volatility", "%0.2f%%" % (values['volatility'] * 100.0)),
+                ("Sharpe Ratio", "%0.2f" % values['sharpe_ratio']),
+                ("Sortino Ratio", "%0.2f" % values['sortino_ratio']),
+                ("Calmar Ratio", "%0.2f" % values['calmar_ratio']),
+                ("Max Drawdown", "%0.2f%%" % (values['max_drawdown'] * 100.0)),
+                ("Drawdown Duration", "%d" % values['drawdown_duration']),
+                ("Hit Rate", "%0.2f%%" % (values['hit_rate'] * 100.0)),
+                ("Turnover", "%0.2f" % values['turnover'])]
 
         return stats
 
-    def plot_holdings(self):
-        holdings_fig, holdings_ax = plt.subplots()
-        self.holdings_curve.plot(ax=holdings_ax)
-        holdings_ax.set_title('Holdings')
-        holdings_ax.set_xlabel('Time')
-        holdings_ax.set_ylabel('Total')
-
-    def plot_performance(self):
-        performance_df = self.data.create_baseline_dataframe()
-        performance_df[self.strategy_name] = self.equity_curve['equity_curve']
-        performance_df = (performance_df * 100) - 100
-        performance_fig, performance_ax = plt.subplots()
-        performance_df.plot(ax=performance_ax)
-        performance_ax.set_title('Performance')
-        performance_ax.set_xlabel('Time')
-        performance_ax.set_ylabel('Return (%)')
-
-    def plot_all(self):
-        style.use('ggplot')
-        self.create_equity_curve_dataframe()
-        self.plot_performance()
-        self.plot_holdings()
-        plt.show()
+    def holdings_chart(self):
+        chart = Chart('Holdings', ylabel='Total')
+        chart.line('total', self.holdings_ledger.dates(), self.holdings_ledger.column('total'))
+        return chart
+
+    def performance_chart(self):
+        # The symbols and the strategy as returns since their first value,
+        # drawn from the bars and the holdings ledger without copying them.
+        chart = Chart('Performance', ylabel='Return (%)')
+        bars = self.data.bars
+        for symbol in self.symbol_list:
+            window = bars.window(symbol, bars.cursor)
+            if len(window) > 0:
+                close = window.close
+                chart.line(symbol, window.time, close, scale=100.0 / close[0], offset=-100.0)
+        total = self.holdings_ledger.column('total')
+        if len(total) > 0:
+            chart.line(self.strategy_name, self.holdings_ledger.dates(), total, scale=100.0 / total[0], offset=-100.0)
+        return chart
+
+    def charts(self):
+        return [self.performance_chart(), self.holdings_chart()]
+
+    def plot_holdings(self, path=None):
+        render([self.holdings_chart()], path)
+
+    def plot_performance(self, path=None):
+        render([self.performance_chart()], path)
+
+    def plot_all(self, path=None):
+        render(self.charts(), path)
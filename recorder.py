@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from ledger import Ledger
+
+class Recorder:
+    def __init__(self, columns, enabled=True, every=1, index_name='Date'):
+        self.columns = list(columns)
+        self.enabled = enabled
+        self.every = every
+        self.index_name = index_name
+        self.ledgers = {}
+        self.counts = {}
+
+    def record(self, key, datetime, *values):
+        if not self.enabled:
+            return
+        count = self.counts.get(key, 0)
+        self.counts[key] = count + 1
+        if count % self.every != 0:
+            return
+
+        ledger = self.ledgers.get(key)
+        if ledger is None:
+            ledger = self.ledgers[key] = Ledger(self.columns)
+        ledger.next_row(datetime)[:] = values
+
+    def frame(self, key):
+        ledger = self.ledgers.get(key)
+        if ledger is None:
+            return pd.DataFrame(np.empty((0, len(self.columns))), index=pd.DatetimeIndex([], name=self.index_name), columns=self.columns)
+        return ledger.to_frame(self.index_name)
+
+    def series(self, key, column):
+        # The dates and the values of one column as views of the recorded
+        # arrays, without building a frame.
+        ledger = self.ledgers.get(key)
+        if ledger is None:
+            return np.empty(0, dtype='datetime64[ns]'), np.empty(0)
+        return ledger.dates(), ledger.column(column)
+
+    def __getitem__(self, key):
+        return self.frame(key)
+
+    def to_frame(self):
+        if len(self.ledgers) == 0:
+            return self.frame(None)
+        return pd.concat({key: self.frame(key) for key in self.ledgers}, names=['Symbol'])
+
+    def to_csv(self, path):
+        self.to_frame().to_csv(path)
@@ -0,0 +1,187 @@
+import argparse
+import hashlib
+import inspect
+import json
+import numpy as np
+import os.path
+import pandas as pd
+import sqlite3
+import sys
+import time
+
+RESULTS_VERSION = 1
+
+METRICS = ['total_return', 'cagr', 'volatility', 'sharpe_ratio', 'sortino_ratio', 'max_drawdown', 'drawdown_duration', 'calmar_ratio', 'hit_rate', 'turnover']
+
+HASH_BLOCK_SIZE = 1 << 20
+
+def _canonical(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+
+def portfolio_record(portfolio):
+    # The equity curve and the trades of a finished run as plain arrays, which
+    # is what worker processes send back.
+    holdings = portfolio.holdings_ledger
+    trades = portfolio.trades_ledger
+    n = len(trades)
+    return {'dates': holdings.index[:len(holdings)].view(np.int64).copy(),
+            'total': holdings.values[:len(holdings), holdings.columns.index('total')].copy(),
+            'trades': list(zip(trades.index[:n].view(np.int64).tolist(),
+                               [portfolio.symbol_list[int(j)] for j in trades.values[:n, 0]],
+                               *trades.values[:n, 1:].T.tolist()))}
+
+class ResultStore:
+    def __init__(self, path='.results.sqlite'):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.sources = {}
+        self._create()
+
+    def _create(self):
+        metrics = ', '.join('{0} REAL'.format(metric) for metric in METRICS)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS runs (key TEXT PRIMARY KEY, strategy TEXT, symbols TEXT, parameters TEXT, initial_capital REAL, created REAL, {0})'.format(metrics))
+            self.connection.execute('CREATE TABLE IF NOT EXISTS curves (key TEXT PRIMARY KEY, dates BLOB, total BLOB)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS trades (key TEXT, datetime INTEGER, symbol TEXT, quantity REAL, price REAL, commission REAL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS runs_parameters ON runs (strategy, symbols, parameters)')
+            for metric in METRICS:
+                self.connection.execute('CREATE INDEX IF NOT EXISTS runs_{0} ON runs (strategy, symbols, {0})'.format(metric))
+            self.connection.execute('CREATE INDEX IF NOT EXISTS trades_key ON trades (key)')
+
+    def close(self):
+        self.connection.close()
+
+    def file_hash(self, path):
+        # Files are hashed by content, and the hash is kept for as long as
+        # their size and modification time stay the same.
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        row = self.connection.execute('SELECT sha256 FROM files WHERE path = ? AND size = ? AND mtime_ns = ?', (path, stat.st_size, stat.st_mtime_ns)).fetchone()
+        if row is not None:
+            return row[0]
+
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                sha256.update(block)
+        digest = sha256.hexdigest()
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)', (path, stat.st_size, stat.st_mtime_ns, digest))
+        return digest
+
+    def source_hash(self, strategy_class):
+        # A change to the strategy's module makes its earlier results stale.
+        module = strategy_class.__module__
+        if module not in self.sources:
+            self.sources[module] = hashlib.sha256(inspect.getsource(sys.modules[module]).encode('utf-8')).hexdigest()
+        return self.sources[module]
+
+    def run_key(self, paths, strategy_class, parameters, initial_capital, **config):
+        inputs = {'version': RESULTS_VERSION,
+                  'data': [self.file_hash(path) for path in paths],
+                  'strategy': strategy_class.__module__ + '.' + strategy_class.__qualname__,
+                  'source': self.source_hash(strategy_class),
+                  'parameters': parameters,
+                  'initial_capital': float(initial_capital),
+                  'config': config}
+        return hashlib.sha256(_canonical(inputs).encode('utf-8')).hexdigest()
+
+    def backtest_key(self, csv_dir, symbol_list, source, strategy_class, parameters, initial_capital):
+        # The key of an event-driven run over CSV files with the simple broker.
+        paths = [os.path.join(csv_dir, symbol + '.csv') for symbol in symbol_list]
+        return self.run_key(paths, strategy_class, parameters, initial_capital, source=source.value, symbols=list(symbol_list), broker='simulate')
+
+    def load(self, key):
+        row = self.connection.execute('SELECT {0} FROM runs WHERE key = ?'.format(', '.join(METRICS)), (key,)).fetchone()
+        if row is None:
+            return None
+        return {metric: np.nan if value is None else value for metric, value in zip(METRICS, row)}
+
+    def save(self, key, strategy_class, symbol_list, parameters, initial_capital, stats, record=None):
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO runs VALUES ({0})'.format(', '.join(['?'] * (6 + len(METRICS)))),
+                                    [key, strategy_class.__name__, ','.join(symbol_list), _canonical(parameters), float(initial_capital), time.time()] +
+                                    [None if stats.get(metric) is None or np.isnan(stats[metric]) else float(stats[metric]) for metric in METRICS])
+            if record is not None:
+                self.connection.execute('INSERT OR REPLACE INTO curves VALUES (?, ?, ?)', (key, record['dates'].tobytes(), record['total'].tobytes()))
+                self.connection.execute('DELETE FROM trades WHERE key = ?', (key,))
+                self.connection.executemany('INSERT INTO trades VALUES (?, ?, ?, ?, ?, ?)', [(key,) + tuple(trade) for trade in record['trades']])
+
+    def equity_curve(self, key):
+        row = self.connection.execute('SELECT dates, total FROM curves WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        curve = pd.DataFrame({'total': np.frombuffer(row[1], dtype=np.float64)}, index=pd.DatetimeIndex(np.frombuffer(row[0], dtype=np.int64).view('datetime64[ns]'), name='datetime'))
+        curve['returns'] = curve['total'].pct_change()
+        curve['equity_curve'] = (1.0 + curve['returns']).cumprod()
+        return curve
+
+    def trades(self, key):
+        trades = pd.read_sql_query('SELECT datetime, symbol, quantity, price, commission FROM trades WHERE key = ? ORDER BY rowid', self.connection, params=(key,))
+        trades.index = pd.DatetimeIndex(trades.pop('datetime').to_numpy(dtype=np.int64).view('datetime64[ns]'), name='datetime')
+        return trades
+
+    def top(self, metric='sharpe_ratio', strategy=None, symbols=None, n=20, ascending=False, **parameters):
+        if metric not in METRICS:
+            raise ValueError("Unknown metric {0}, expected one of {1}.".format(metric, ', '.join(METRICS)))
+
+        conditions = ['{0} IS NOT NULL'.format(metric)]
+        values = []
+        if strategy is not None:
+            conditions.append('strategy = ?')
+            values.append(strategy)
+        if symbols is not None:
+            conditions.append('symbols = ?')
+            values.append(','.join(symbols))
+        for name, value in parameters.items():
+            conditions.append("json_extract(parameters, '$.' || ?) = ?")
+            values.extend([name, value])
+
+        query = 'SELECT key, strategy, symbols, parameters, initial_capital, {0} FROM runs WHERE {1} ORDER BY {2} {3} LIMIT ?'.format(
+            ', '.join(METRICS), ' AND '.join(conditions), metric, 'ASC' if ascending else 'DESC')
+        results = pd.read_sql_query(query, self.connection, params=values + [n])
+        results['parameters'] = [json.loads(parameters) for parameters in results['parameters']]
+        return results
+
+def cached_backtest(store, csv_dir, symbol_list, strategy_class, parameters, source=None, initial_capital=1.0):
+    from data import HistoricCSVDataHandler, DataSource
+    from dispatch import EventQueue
+    from execution import SimulateExecutionHandler
+    from loop import run
+    from portfolio import NaivePortfolio
+
+    source = source if source is not None else DataSource.NASDAQ
+    key = store.backtest_key(csv_dir, symbol_list, source, strategy_class, parameters, initial_capital)
+    stats = store.load(key)
+    if stats is not None:
+        return key, stats
+
+    events = EventQueue()
+    data = HistoricCSVDataHandler(events, csv_dir, symbol_list, source)
+    portfolio = NaivePortfolio(data, events, '', initial_capital=initial_capital)
+    strategy = strategy_class(data, events, portfolio, **parameters)
+    portfolio.strategy_name = strategy.name
+    run(events, data, portfolio, strategy, SimulateExecutionHandler(events))
+    stats = portfolio.calculate_stats()
+    store.save(key, strategy_class, symbol_list, parameters, initial_capital, stats, portfolio_record(portfolio))
+    return key, stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Query stored backtest results.')
+    parser.add_argument('--store', default='.results.sqlite')
+    parser.add_argument('--metric', choices=METRICS, default='sharpe_ratio')
+    parser.add_argument('--strategy', default=None)
+    parser.add_argument('--symbols', nargs='+', default=None)
+    parser.add_argument('-n', type=int, default=20)
+    parser.add_argument('--ascending', action='store_true')
+    args = parser.parse_args(argv)
+
+    store = ResultStore(args.store)
+    results = store.top(args.metric, args.strategy, args.symbols, args.n, args.ascending)
+    print(results.drop(columns=['key']).to_string(index=False))
+    store.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+import numpy as np
+import os
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor
+from performance import calculate_max_drawdowns
+
+def block_bootstrap(returns, paths, block, rng):
+    # Circular blocks keep the autocorrelation within each block and give
+    # every bar the same chance of being drawn.
+    n = len(returns)
+    blocks = -(-n // block)
+    starts = rng.integers(0, n, (paths, blocks))
+    indices = (starts[:, :, None] + np.arange(block)).reshape(paths, blocks * block)[:, :n] % n
+    return returns[indices]
+
+METHODS = {'block': block_bootstrap}
+
+def path_statistics(returns, periods=252):
+    # Resampled arrays are scratch space, so the equity curve and the
+    # drawdowns are built in place to keep a batch within one copy.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe_ratio = np.sqrt(periods) * returns.mean(axis=1) / returns.std(axis=1)
+    equity = np.cumprod(np.add(returns, 1.0, out=returns), axis=1, out=returns)
+    total_return = equity[:, -1] - 1.0
+    # Drawdowns are measured as in summary_stats, where the high-water mark
+    # starts with the first resampled bar rather than the initial capital.
+    return {'total_return': total_return,
+            'sharpe_ratio': sharpe_ratio,
+            'max_drawdown': calculate_max_drawdowns(equity)}
+
+def _resample_batch(returns, paths, method, block, periods, seed):
+    rng = np.random.default_rng(seed)
+    return path_statistics(METHODS[method](returns, paths, block, rng), periods)
+
+def bootstrap(returns, paths=10000, method='block', block=20, periods=252, batch=1000, processes=None, seed=None):
+    returns = np.asarray(returns, dtype=np.float64)
+    returns = returns[~np.isnan(returns)]
+    if len(returns) == 0:
+        raise ValueError("No returns to resample.")
+    if method not in METHODS:
+        raise ValueError("Unknown resampling method {0}, expected one of {1}.".format(method, ', '.join(METHODS)))
+
+    # Every batch is a (paths x bars) array with its own seed, so the result
+    # depends on the seed and the batch size but not on the processes.
+    sizes = [min(batch, paths - start) for start in range(0, paths, batch)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    processes = min(processes or os.cpu_count(), len(sizes))
+    if processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(_resample_batch, [returns] * len(sizes), sizes, [method] * len(sizes), [block] * len(sizes), [periods] * len(sizes), seeds))
+    else:
+        results = [_resample_batch(returns, size, method, block, periods, s) for size, s in zip(sizes, seeds)]
+
+    return pd.DataFrame({name: np.concatenate([result[name] for result in results]) for name in results[0]})
+
+def confidence_intervals(distribution, quantiles=(0.05, 0.5, 0.95)):
+    return distribution.quantile(list(quantiles)).T
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    from data import HistoricCSVDataHandler, DataSource
+    from dispatch import EventQueue
+    from execution import SimulateExecutionHandler
+    from loop import run
+    from portfolio import NaivePortfolio
+    from strategies.macd import MovingAveragesLongStrategy
+
+    paths = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    events = EventQueue()
+    data = HistoricCSVDataHandler(events, 'csv/', ['OMXS30'], DataSource.NASDAQ)
+    portfolio = NaivePortfolio(data, events, '', initial_capital=2000)
+    strategy = MovingAveragesLongStrategy(data, events, portfolio, 100, 200, version=1, record=False)
+    run(events, data, portfolio, strategy, SimulateExecutionHandler(events))
+    portfolio.create_equity_curve_dataframe()
+
+    for method in METHODS:
+        start = time.perf_counter()
+        distribution = bootstrap(portfolio.equity_curve['returns'], paths, method, seed=0)
+        print("{0} ({1} paths, {2:.2f}s)".format(method, paths, time.perf_counter() - start))
+        print(confidence_intervals(distribution).to_string())
@@ -1,4 +1,4 @@
-import pandas as pd
+import numpy as np
 import math
 from datetime import datetime
 from event import SignalEvent
@@ -12,16 +12,17 @@ class DivideAndConquerStrategy(Strategy):
         self.portfolio = portfolio
         self.name = 'Divide And Conquer'
 
+        for symbol in self.symbol_list:
+            self.data.subscribe(symbol, 7)
+
     def calculate_signals(self, event):
         if event.type == 'MARKET':
             for symbol in self.symbol_list:
-                data = self.data.get_latest_data(symbol, N=7)
-                df = pd.DataFrame(data, columns=['Symbol','Date','Close'])
-                df = df.drop(['Symbol'], axis=1)
-                df.set_index('Date', inplace=True)
-                if data is not None and len(data) > 0:
-                    mean = df['Close'].pct_change().mean()
-                    latest_close = data[-1][self.data.price_col]
+                data = self.data.get_window(symbol)
+                if len(data) > 0:
+                    closes = data.close
+                    mean = np.mean(closes[1:] / closes[:-1] - 1.0) if len(closes) > 1 else np.nan
+                    latest_close = closes[-1]
                     if mean < 0:
                         quantity = math.floor(self.portfolio.current_holdings['cash'] / (2*latest_close))
                         if quantity != 0:
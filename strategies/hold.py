@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import math
 from datetime import datetime
@@ -32,6 +33,9 @@ class BuyAndHoldStrategy(Strategy):
                         self.events.put(signal)
                         self.bought[symbol] = True
 
+    def calculate_vectorized_signals(self, prices):
+        return np.ones(prices.shape)
+
 class SellAndHoldStrategy(Strategy):
     def __init__(self, data, events, portfolio):
         self.data = data
@@ -58,4 +62,7 @@ class SellAndHoldStrategy(Strategy):
                         quantity = math.floor(self.portfolio.current_holdings['cash'] / data[-1][self.data.price_col])
                         signal = SignalEvent(symbol, data[0][self.data.time_col], 'SHORT', quantity)
                         self.events.put(signal)
-                        self.bought[symbol] = True
\ No newline at end of file
+                        self.bought[symbol] = True
+
+    def calculate_vectorized_signals(self, prices):
+        return -np.ones(prices.shape)
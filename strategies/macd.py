@@ -1,13 +1,37 @@
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import math
 from datetime import datetime
-from matplotlib import style
 from event import SignalEvent
+from indicators import EMA, calculate_ema
+from plotting import Chart
+from recorder import Recorder
 from strategies.strategy import Strategy
 
+def moving_averages_chart(strategy, symbol, short_label):
+    # The closes are views of the bars, and the EMAs and signals of what the
+    # strategy recorded, so nothing is copied before it is decimated.
+    chart = Chart(strategy.name)
+    bars = strategy.data.bars
+    window = bars.window(symbol, bars.cursor)
+    time = window.time
+    close = window.close
+    chart.line(symbol, time, close, color='dodgerblue')
+    dates, short = strategy.strategy.series(symbol, 'Short')
+    chart.line('Short EMA', dates, short, color='grey', linewidth=1.5)
+    chart.line('Long EMA', dates, strategy.strategy.series(symbol, 'Long')[1], color='k', linewidth=1.5)
+
+    dates, signals = strategy.signals.series(symbol, 'Signal')
+    i = np.searchsorted(time, dates)
+    found = i < len(time)
+    found[found] = time[i[found]] == dates[found]
+    for label, selected, marker, color in ((short_label, signals < 0, 'v', 'r'), ('Long', signals > 0, '^', 'g')):
+        selected = selected & found
+        chart.marker(label, dates[selected], close[i[selected]], marker, color)
+    return chart
+
 class MovingAveragesLongStrategy(Strategy):
-    def __init__(self, data, events, portfolio, short_period, long_period, verbose=False, version=1):
+    def __init__(self, data, events, portfolio, short_period, long_period, verbose=False, version=1, record=True, record_every=1):
         self.data = data
         self.symbol_list = self.data.symbol_list
         self.events = events
@@ -18,102 +42,101 @@ class MovingAveragesLongStrategy(Strategy):
         self.verbose = verbose
         self.version = version
 
-        self.signals = self._setup_signals()
-        self.strategy = self._setup_strategy()
+        # The EMAs can be sampled every record_every bars; signals are
+        # always kept while recording.
+        self.signals = Recorder(['Signal'], enabled=record)
+        self.strategy = Recorder(['Short', 'Long'], enabled=record, every=record_every)
         self.bought = self._setup_initial_bought()
+        self.indicators = self._setup_indicators()
+        self.history = self._setup_history()
 
-    def _setup_signals(self):
-        signals = {}
+    def _setup_initial_bought(self):
+        bought = {}
         for symbol in self.symbol_list:
-            signals[symbol] = pd.DataFrame(columns=['Date', 'Signal'])
+            bought[symbol] = False
 
-        return signals
+        return bought
 
-    def _setup_strategy(self):
-        strategy = {}
+    def _setup_indicators(self):
+        indicators = {}
         for symbol in self.symbol_list:
-            strategy[symbol] = pd.DataFrame(columns=['Date', 'Short', 'Long'])
+            if self.version == 1:
+                indicators[symbol] = (EMA(self.short_period, min_periods=self.short_period), EMA(self.long_period, min_periods=self.long_period))
+            else:
+                indicators[symbol] = (EMA(self.short_period, window=self.long_period), EMA(self.long_period, window=self.long_period))
 
-        return strategy
+        return indicators
 
-    def _setup_initial_bought(self):
-        bought = {}
+    def _setup_history(self):
+        history = {}
         for symbol in self.symbol_list:
-            bought[symbol] = False
+            history[symbol] = -1
 
-        return bought
+        return history
+
+    def calculate_long_short(self, symbol, price):
+        ema_short, ema_long = self.indicators[symbol]
+        return ema_short.update(price), ema_long.update(price)
 
-    def calculate_long_short(self, df):
-        price_short = None
-        price_long = None
+    def calculate_vectorized_long_short(self, closes):
         if self.version == 1:
-            price_short = df['Close'].ewm(span=self.short_period, min_periods=self.short_period, adjust=False).mean()[-1]
-            price_long = df['Close'].ewm(span=self.long_period, min_periods=self.long_period, adjust=False).mean()[-1]
-        else:
-            price_short = df['Close'].tail(self.long_period).ewm(span=self.short_period, adjust=False).mean()[-1]
-            price_long = df['Close'].tail(self.long_period).ewm(span=self.long_period, adjust=False).mean()[-1]
+            return calculate_ema(closes, self.short_period, min_periods=self.short_period), calculate_ema(closes, self.long_period, min_periods=self.long_period)
+        return calculate_ema(closes, self.short_period, window=self.long_period), calculate_ema(closes, self.long_period, window=self.long_period)
+
+    def _update_history(self, symbol):
+        # The EMAs have always been computed over get_latest_data(N=-1),
+        # which leaves out the very first bar, so it is skipped here too.
+        data = self.data.get_latest_data(symbol, N=1)
+        if data is None or len(data) == 0:
+            return None
+        self.history[symbol] += 1
+        if self.history[symbol] == 0:
+            return None
 
-        return price_short, price_long
+        return data[-1]
 
     def calculate_signals(self, event):
         if event.type == 'MARKET':
             for symbol in self.symbol_list:
-                data = self.data.get_latest_data(symbol, N=-1)
-                df = pd.DataFrame(data, columns=['Symbol','Date','Close'])
-                df = df.drop(['Symbol'], axis=1)
-                df.set_index('Date', inplace=True)
-                if data is not None and len(data) >= self.long_period:
-                    price_short, price_long = self.calculate_long_short(df)
-                    date = df.index.values[-1]
-                    price = df['Close'][-1]
-                    self.strategy[symbol] = self.strategy[symbol].append({'Date': date, 'Short': price_short, 'Long': price_long}, ignore_index=True)
+                bar = self._update_history(symbol)
+                if bar is None:
+                    continue
+                price_short, price_long = self.calculate_long_short(symbol, bar[self.data.price_col])
+                if self.history[symbol] >= self.long_period:
+                    date = bar[self.data.time_col]
+                    price = bar[self.data.price_col]
+                    self.strategy.record(symbol, date, price_short, price_long)
                     if self.bought[symbol] == False and price_short > price_long:
                         quantity = math.floor(self.portfolio.current_holdings['cash'] / price)
                         signal = SignalEvent(symbol, date, 'LONG', quantity)
                         self.events.put(signal)
                         self.bought[symbol] = True
-                        self.signals[symbol] = self.signals[symbol].append({'Signal': quantity, 'Date': date}, ignore_index=True)
+                        self.signals.record(symbol, date, quantity)
                         if self.verbose: print("Long", date, price)
                     elif self.bought[symbol] == True and price_short < price_long:
                         quantity = self.portfolio.current_positions[symbol]
                         signal = SignalEvent(symbol, date, 'EXIT', quantity)
                         self.events.put(signal)
                         self.bought[symbol] = False
-                        self.signals[symbol] = self.signals[symbol].append({'Signal': -quantity, 'Date': date}, ignore_index=True)
+                        self.signals.record(symbol, date, -quantity)
                         if self.verbose: print("Exit", date, price)
 
-    def plot(self):
-        style.use('ggplot')
+    def calculate_vectorized_signals(self, prices):
+        closes = prices.to_numpy(dtype=np.float64)
+        signals = np.zeros(closes.shape)
+        active = np.arange(1, len(closes)) >= self.long_period
+        for j in range(closes.shape[1]):
+            price_short, price_long = self.calculate_vectorized_long_short(closes[1:, j])
+            crossed = np.where(active & (price_short > price_long), 1.0, np.where(active & (price_short < price_long), 0.0, np.nan))
+            signals[1:, j] = pd.Series(crossed).ffill().fillna(0.0).to_numpy()
 
-        for symbol in self.symbol_list:
-            self.strategy[symbol].set_index('Date', inplace=True)
-            self.signals[symbol].set_index('Date', inplace=True)
-            signals = self.signals[symbol]
-            strategy_fig, strategy_ax = plt.subplots()
-            df = self.data.all_data[symbol].copy()
-            df.columns = ['OMXS30']
-            # df['Short'] = df['OMXS30'].ewm(span=self.short_period, min_periods=self.short_period, adjust=False).mean()
-            # df['Long'] = df['OMXS30'].ewm(span=self.long_period, min_periods=self.long_period, adjust=False).mean()
-
-            df.plot(ax=strategy_ax, color='dodgerblue', linewidth=1.0)
-
-            short_index = signals[signals['Signal'] < 0].index
-            long_index = signals[signals['Signal'] > 0].index
-
-            strategy_ax.plot(self.strategy[symbol]['Short'], label='Short EMA', color='grey')
-            strategy_ax.plot(self.strategy[symbol]['Long'], label='Long EMA', color='k')
-            strategy_ax.plot(short_index, df['OMXS30'].loc[short_index], 'v', markersize=10, color='r', label='Exit')
-            strategy_ax.plot(long_index, df['OMXS30'].loc[long_index], '^', markersize=10, color='g', label='Long')
-
-            strategy_ax.set_title(self.name)
-            strategy_ax.set_xlabel('Time')
-            strategy_ax.set_ylabel('Value')
-            strategy_ax.legend()
+        return signals
 
-        plt.show()
+    def charts(self):
+        return [moving_averages_chart(self, symbol, 'Exit') for symbol in self.symbol_list]
 
 class MovingAveragesLongShortStrategy(Strategy):
-    def __init__(self, data, events, portfolio, short_period, long_period, version=1):
+    def __init__(self, data, events, portfolio, short_period, long_period, verbose=False, version=1, record=True, record_every=1):
         self.data = data
         self.symbol_list = self.data.symbol_list
         self.events = events
@@ -121,56 +144,71 @@ class MovingAveragesLongShortStrategy(Strategy):
         self.short_period = short_period
         self.long_period = long_period
         self.name = 'Moving Averages Long Short'
+        self.verbose = verbose
         self.version = version
 
-        self.signals = self._setup_signals()
-        self.strategy = self._setup_strategy()
+        # The EMAs can be sampled every record_every bars; signals are
+        # always kept while recording.
+        self.signals = Recorder(['Signal'], enabled=record)
+        self.strategy = Recorder(['Short', 'Long'], enabled=record, every=record_every)
         self.bought = self._setup_initial_bought()
+        self.indicators = self._setup_indicators()
+        self.history = self._setup_history()
 
-    def _setup_signals(self):
-        signals = {}
+    def _setup_initial_bought(self):
+        bought = {}
         for symbol in self.symbol_list:
-            signals[symbol] = pd.DataFrame(columns=['Date', 'Signal'])
+            bought[symbol] = False
 
-        return signals
+        return bought
 
-    def _setup_strategy(self):
-        strategy = {}
+    def _setup_indicators(self):
+        indicators = {}
         for symbol in self.symbol_list:
-            strategy[symbol] = pd.DataFrame(columns=['Date', 'Short', 'Long'])
+            if self.version == 1:
+                indicators[symbol] = (EMA(self.short_period, min_periods=self.short_period), EMA(self.long_period, min_periods=self.long_period))
+            else:
+                indicators[symbol] = (EMA(self.short_period, window=self.long_period), EMA(self.long_period, window=self.long_period))
 
-        return strategy
+        return indicators
 
-    def _setup_initial_bought(self):
-        bought = {}
+    def _setup_history(self):
+        history = {}
         for symbol in self.symbol_list:
-            bought[symbol] = False
+            history[symbol] = -1
 
-        return bought
+        return history
+
+    def calculate_long_short(self, symbol, price):
+        ema_short, ema_long = self.indicators[symbol]
+        return ema_short.update(price), ema_long.update(price)
 
-    def calculate_long_short(self, df):
-        price_short = None
-        price_long = None
+    def calculate_vectorized_long_short(self, closes):
         if self.version == 1:
-            price_short = df['Close'].ewm(span=self.short_period, min_periods=self.short_period, adjust=False).mean()[-1]
-            price_long = df['Close'].ewm(span=self.long_period, min_periods=self.long_period, adjust=False).mean()[-1]
-        else:
-            price_short = df['Close'].tail(self.long_period).ewm(span=self.short_period, adjust=False).mean()[-1]
-            price_long = df['Close'].tail(self.long_period).ewm(span=self.long_period, adjust=False).mean()[-1]
+            return calculate_ema(closes, self.short_period, min_periods=self.short_period), calculate_ema(closes, self.long_period, min_periods=self.long_period)
+        return calculate_ema(closes, self.short_period, window=self.long_period), calculate_ema(closes, self.long_period, window=self.long_period)
 
-        return price_short, price_long
+    def _update_history(self, symbol):
+        data = self.data.get_latest_data(symbol, N=1)
+        if data is None or len(data) == 0:
+            return None
+        self.history[symbol] += 1
+        if self.history[symbol] == 0:
+            return None
+
+        return data[-1]
 
     def calculate_signals(self, event):
         if event.type == 'MARKET':
             for symbol in self.symbol_list:
-                data = self.data.get_latest_data(symbol, N=-1)
-                df = pd.DataFrame(data, columns=['Symbol','Date','Close'])
-                df = df.drop(['Symbol'], axis=1)
-                df.set_index('Date', inplace=True)
-                if data is not None and len(data) >= self.long_period:
-                    price_short, price_long = self.calculate_long_short(df)
-                    date = data[-1][self.data.time_col]
-                    price = data[-1][self.data.price_col]
+                bar = self._update_history(symbol)
+                if bar is None:
+                    continue
+                price_short, price_long = self.calculate_long_short(symbol, bar[self.data.price_col])
+                if self.history[symbol] >= self.long_period:
+                    date = bar[self.data.time_col]
+                    price = bar[self.data.price_col]
+                    self.strategy.record(symbol, date, price_short, price_long)
                     if self.bought[symbol] == False and price_short > price_long:
                         current_positions = self.portfolio.current_positions[symbol]
                         quantity = math.floor(self.portfolio.current_holdings['cash'] / price + current_positions)
@@ -179,7 +217,7 @@ class MovingAveragesLongShortStrategy(Strategy):
                         signal = SignalEvent(symbol, date, 'LONG', quantity)
                         self.events.put(signal)
                         self.bought[symbol] = True
-                        self.signals[symbol] = self.signals[symbol].append({'Signal': quantity, 'Date': date}, ignore_index=True)
+                        self.signals.record(symbol, date, quantity)
                         if self.verbose: print("Long", date, price)
                     elif self.bought[symbol] == True and price_short < price_long:
                         quantity = self.portfolio.current_positions[symbol]
@@ -188,41 +226,40 @@ class MovingAveragesLongShortStrategy(Strategy):
                         signal = SignalEvent(symbol, date, 'SHORT', quantity)
                         self.events.put(signal)
                         self.bought[symbol] = False
-                        self.signals[symbol] = self.signals[symbol].append({'Signal': -quantity, 'Date': date}, ignore_index=True)
+                        self.signals.record(symbol, date, -quantity)
                         if self.verbose: print("Short", date, price)
 
-    def plot(self):
-        style.use('ggplot')
-
-        for symbol in self.symbol_list:
-            self.strategy[symbol].set_index('Date', inplace=True)
-            self.signals[symbol].set_index('Date', inplace=True)
-            signals = self.signals[symbol]
-            strategy_fig, strategy_ax = plt.subplots()
-            df = self.data.all_data[symbol].copy()
-            df.columns = ['OMXS30']
-            # df['Short'] = df['OMXS30'].ewm(span=self.short_period, min_periods=self.short_period, adjust=False).mean()
-            # df['Long'] = df['OMXS30'].ewm(span=self.long_period, min_periods=self.long_period, adjust=False).mean()
-
-            df.plot(ax=strategy_ax, color='dodgerblue', linewidth=1.0)
+    def calculate_vectorized_signals(self, prices):
+        closes = prices.to_numpy(dtype=np.float64)
+        signals = np.zeros(closes.shape)
+        active = np.arange(1, len(closes)) >= self.long_period
+        for j in range(closes.shape[1]):
+            price_short, price_long = self.calculate_vectorized_long_short(closes[1:, j])
+            crossed = np.where(active & (price_short > price_long), 1.0, np.where(active & (price_short < price_long), -1.0, np.nan))
+            crossed = pd.Series(crossed).ffill().fillna(0.0).to_numpy(copy=True)
+            longs = np.flatnonzero(crossed == 1.0)
+            crossed[:longs[0] if len(longs) > 0 else len(crossed)] = 0.0
+            signals[1:, j] = crossed
 
-            short_index = signals[signals['Signal'] < 0].index
-            long_index = signals[signals['Signal'] > 0].index
+        return signals
 
-            strategy_ax.plot(self.strategy[symbol]['Short'], label='Short EMA', color='grey')
-            strategy_ax.plot(self.strategy[symbol]['Long'], label='Long EMA', color='k')
-            strategy_ax.plot(short_index, df['OMXS30'].loc[short_index], 'v', markersize=10, color='r', label='Short')
-            strategy_ax.plot(long_index, df['OMXS30'].loc[long_index], '^', markersize=10, color='g', label='Long')
+    def vectorized_position(self, signal, position, cash, price):
+        # EXIT followed by SHORT of the current position only reverses longs.
+        if signal < 0:
+            return -position if position > 0 else position
+        return math.floor(cash / price + position)
 
-            strategy_ax.set_title(self.name)
-            strategy_ax.set_xlabel('Time')
-            strategy_ax.set_ylabel('Value')
-            strategy_ax.legend()
+    def vectorized_fills(self, position, target):
+        # Every signal exits the current position before entering the new one.
+        if position != 0:
+            return [-position, target]
+        return [target]
 
-        plt.show()
+    def charts(self):
+        return [moving_averages_chart(self, symbol, 'Short') for symbol in self.symbol_list]
 
 class MovingAveragesMomentumStrategy(Strategy):
-    def __init__(self, data, events, portfolio, short_period, long_period):
+    def __init__(self, data, events, portfolio, short_period, long_period, verbose=False, version=1, record=True, record_every=1):
         self.data = data
         self.symbol_list = self.data.symbol_list
         self.events = events
@@ -230,41 +267,72 @@ class MovingAveragesMomentumStrategy(Strategy):
         self.short_period = short_period
         self.long_period = long_period
         self.name = 'Moving Averages Momentum'
+        self.verbose = verbose
+        self.version = version
 
-    def calculate_long_short(self, df):
-        price_short = None
-        price_long = None
-        if self.version == 1:
-            price_short = df['Close'].ewm(span=self.short_period, min_periods=self.short_period, adjust=False).mean()[-1]
-            price_long = df['Close'].ewm(span=self.long_period, min_periods=self.long_period, adjust=False).mean()[-1]
-        else:
-            price_short = df['Close'].tail(self.long_period).ewm(span=self.short_period, adjust=False).mean()[-1]
-            price_long = df['Close'].tail(self.long_period).ewm(span=self.long_period, adjust=False).mean()[-1]
+        self.signals = Recorder(['Signal'], enabled=record)
+        self.strategy = Recorder(['Short', 'Long'], enabled=record, every=record_every)
+        self.indicators = self._setup_indicators()
+        self.history = self._setup_history()
+
+    def _setup_indicators(self):
+        indicators = {}
+        for symbol in self.symbol_list:
+            if self.version == 1:
+                indicators[symbol] = (EMA(self.short_period, min_periods=self.short_period), EMA(self.long_period, min_periods=self.long_period))
+            else:
+                indicators[symbol] = (EMA(self.short_period, window=self.long_period), EMA(self.long_period, window=self.long_period))
+
+        return indicators
 
-        return price_short, price_long
+    def _setup_history(self):
+        history = {}
+        for symbol in self.symbol_list:
+            history[symbol] = -1
+
+        return history
+
+    def calculate_long_short(self, symbol, price):
+        ema_short, ema_long = self.indicators[symbol]
+        return ema_short.update(price), ema_long.update(price)
+
+    def _update_history(self, symbol):
+        data = self.data.get_latest_data(symbol, N=1)
+        if data is None or len(data) == 0:
+            return None
+        self.history[symbol] += 1
+        if self.history[symbol] == 0:
+            return None
+
+        return data[-1]
 
     def calculate_signals(self, event):
         if event.type == 'MARKET':
             for symbol in self.symbol_list:
-                data = self.data.get_latest_data(symbol, N=-1)
-                df = pd.DataFrame(data, columns=['Symbol','Date','Close'])
-                df = df.drop(['Symbol'], axis=1)
-                df.set_index('Date', inplace=True)
-                if data is not None and len(data) >= self.long_period:
-                    price_short, price_long = self.calculate_long_short(df)
+                bar = self._update_history(symbol)
+                if bar is None:
+                    continue
+                price_short, price_long = self.calculate_long_short(symbol, bar[self.data.price_col])
+                if self.history[symbol] >= self.long_period:
                     diff = price_long - price_short
                     factor = math.fabs(2*math.atan(diff) / math.pi)
-                    date = data[-1][self.data.time_col]
-                    price = data[-1][self.data.price_col]
+                    date = bar[self.data.time_col]
+                    price = bar[self.data.price_col]
+                    self.strategy.record(symbol, date, price_short, price_long)
                     if price_short >= price_long:
                         quantity = math.floor(factor * self.portfolio.current_holdings['cash'] / price)
                         if quantity != 0:
                             signal = SignalEvent(symbol, date, 'LONG', quantity)
                             self.events.put(signal)
+                            self.signals.record(symbol, date, quantity)
                             if self.verbose: print('Long', date, price)
                     else:
                         quantity = math.floor(factor/2 * self.portfolio.current_positions[symbol])
                         if quantity != 0:
                             signal = SignalEvent(symbol, date, 'SHORT', quantity)
                             self.events.put(signal)
-                            if self.verbose: print('Short', date, price)
\ No newline at end of file
+                            self.signals.record(symbol, date, -quantity)
+                            if self.verbose: print('Short', date, price)
+
+    def charts(self):
+        return [moving_averages_chart(self, symbol, 'Short') for symbol in self.symbol_list]
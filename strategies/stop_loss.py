@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import math
 from datetime import datetime
@@ -5,7 +6,7 @@ from event import SignalEvent
 from strategies.strategy import Strategy
 
 class StopLossStrategy(Strategy):
-    def __init__(self, data, events, portfolio, stop_loss_percentage):
+    def __init__(self, data, events, portfolio, stop_loss_percentage, broker_stops=False):
         self.data = data
         self.symbol_list = self.data.symbol_list
         self.events = events
@@ -15,6 +16,13 @@ class StopLossStrategy(Strategy):
         self.bought = self._calculate_initial_bought()
         self.stop_loss_percentage = stop_loss_percentage
         self.stop_loss = self._set_initial_stop_loss()
+        # With broker_stops the stop is a resting order at the broker, which
+        # needs an execution handler that supports STP orders.
+        self.broker_stops = broker_stops
+        self.quantity = {}
+
+        for symbol in self.symbol_list:
+            self.data.subscribe(symbol, 2)
 
     def _calculate_initial_bought(self):
         bought = {}
@@ -30,22 +38,32 @@ class StopLossStrategy(Strategy):
 
         return stop_loss
 
+    def _place_stop(self, symbol, date):
+        signal = SignalEvent(symbol, date, 'SHORT', self.quantity[symbol], order_type='STP', stop_price=self.stop_loss[symbol], order_id=symbol + ' stop')
+        self.events.put(signal)
+
     def calculate_signals(self, event):
         if event.type == 'MARKET':
             for symbol in self.symbol_list:
                 data = self.data.get_latest_data(symbol)
                 if data is not None and len(data) > 0:
                     latest_close = data[-1][self.data.price_col]
-                    if self.bought[symbol] == False and latest_close > self.stop_loss[symbol] / self.stop_loss_percentage:
+                    if self.broker_stops and self.bought[symbol] == True and self.portfolio.current_positions[symbol] == 0:
+                        self.bought[symbol] = False
+                        print("Exit:", data[-1][self.data.time_col], self.stop_loss[symbol])
+                    elif self.bought[symbol] == False and latest_close > self.stop_loss[symbol] / self.stop_loss_percentage:
                         quantity = math.floor(self.portfolio.current_holdings['cash'] / latest_close)
                         signal = SignalEvent(symbol, data[-1][self.data.time_col], 'LONG', quantity)
                         self.events.put(signal)
                         self.bought[symbol] = True
                         self.stop_loss[symbol] = self.stop_loss_percentage * latest_close
+                        if self.broker_stops:
+                            self.quantity[symbol] = quantity
+                            self._place_stop(symbol, data[-1][self.data.time_col])
                         print("Long:", data[-1][self.data.time_col], latest_close)
                         print("Stop Loss:", self.stop_loss[symbol])
                     elif self.bought[symbol] == True:
-                        if latest_close <= self.stop_loss[symbol]:
+                        if latest_close <= self.stop_loss[symbol] and not self.broker_stops:
                             quantity = self.portfolio.current_positions[symbol]
                             signal = SignalEvent(symbol, data[-1][self.data.time_col], 'EXIT', quantity)
                             self.events.put(signal)
@@ -56,4 +74,57 @@ class StopLossStrategy(Strategy):
                             data = self.data.get_latest_data(symbol, N=2)
                             if data is not None and len(data) > 1:
                                 if data[-1][self.data.price_col] > data[0][self.data.price_col] and self.stop_loss_percentage * data[-1][self.data.price_col] > self.stop_loss[symbol]:
-                                    self.stop_loss[symbol] = self.stop_loss_percentage * data[-1][self.data.price_col]
\ No newline at end of file
+                                    self.stop_loss[symbol] = self.stop_loss_percentage * data[-1][self.data.price_col]
+                                    if self.broker_stops:
+                                        self._place_stop(symbol, data[-1][self.data.time_col])
+
+    # Both searches look at windows that double in size, so a trade costs
+    # about as much as the bars it spans.
+    def _find_entry(self, close, start, level):
+        size = 64
+        while start < len(close):
+            end = min(start + size, len(close))
+            entries = np.flatnonzero(close[start:end] > level)
+            if len(entries) > 0:
+                return start + entries[0]
+            start = end
+            size *= 2
+        return None
+
+    def _find_exit(self, close, entry):
+        high = close[entry]
+        start = entry + 1
+        size = 64
+        while start < len(close):
+            end = min(start + size, len(close))
+            stops = self.stop_loss_percentage * np.maximum.accumulate(np.concatenate(([high], close[start:end])))
+            exits = np.flatnonzero(close[start:end] <= stops[:-1])
+            if len(exits) > 0:
+                return start + exits[0], stops[exits[0]]
+            high = max(high, np.max(close[start:end]))
+            start = end
+            size *= 2
+        return None, None
+
+    def calculate_vectorized_signals(self, prices):
+        # The stop trails the highest close since the entry, and the next
+        # entry needs a close above the stop it left at, so only the trades
+        # are walked one by one.
+        closes = prices.to_numpy(dtype=np.float64)
+        signals = np.zeros(closes.shape)
+        for j in range(closes.shape[1]):
+            close = closes[:, j]
+            stop_loss = self.stop_loss_percentage
+            t = 0
+            while t < len(close):
+                entry = self._find_entry(close, t, stop_loss / self.stop_loss_percentage)
+                if entry is None:
+                    break
+                exit, stop_loss = self._find_exit(close, entry)
+                if exit is None:
+                    signals[entry:, j] = 1.0
+                    break
+                signals[entry:exit, j] = 1.0
+                t = exit + 1
+
+        return signals
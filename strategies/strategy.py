@@ -1,10 +1,30 @@
+import math
+
 from abc import ABCMeta, abstractmethod
+from plotting import render
 
 class Strategy(metaclass=ABCMeta):
     @abstractmethod
     def calculate_signals(self):
         raise NotImplementedError
 
-    @abstractmethod
-    def plot(self):
+    def charts(self):
+        return []
+
+    def plot(self, path=None):
+        render(self.charts(), path)
+
+    def calculate_vectorized_signals(self, prices):
         raise NotImplementedError
+
+    def vectorized_position(self, signal, position, cash, price):
+        if signal == 0:
+            return 0.0
+        if signal * position > 0:
+            return position
+        return signal * math.floor(cash / price + position)
+
+    def vectorized_fills(self, position, target):
+        if position * target < 0:
+            return [-position, target]
+        return [target - position]
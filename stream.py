@@ -0,0 +1,65 @@
+import io
+import numpy as np
+import pandas as pd
+
+READ_BLOCK_SIZE = 1 << 20
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        return f.readline().decode('utf-8').rstrip('\r\n').split(',')
+
+def read_lines_reversed(path, block_size=READ_BLOCK_SIZE):
+    # Yields the lines after the header from the last to the first, reading
+    # the file backwards one block at a time.
+    with open(path, 'rb') as f:
+        f.readline()
+        start = f.tell()
+        f.seek(0, 2)
+        position = f.tell()
+        remainder = b''
+        while position > start:
+            size = min(block_size, position - start)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + remainder).split(b'\n')
+            remainder = lines[0]
+            for line in reversed(lines[1:]):
+                line = line.rstrip(b'\r')
+                if line:
+                    yield line
+
+        remainder = remainder.rstrip(b'\r')
+        if remainder:
+            yield remainder
+
+def _split_chunk(chunk, date_label, close_label, labels):
+    dates = pd.to_datetime(chunk[date_label]).values.astype('datetime64[ns]').view(np.int64)
+    values = chunk[labels].to_numpy(dtype=np.float64) if labels else np.empty((len(chunk), 0))
+    return dates, chunk[close_label].to_numpy(dtype=np.float64), values
+
+def _parse_chunk(lines, date_col, close_col, cols):
+    chunk = pd.read_csv(io.BytesIO(b'\n'.join(lines)), header=None, usecols=[date_col, close_col] + cols)
+    return _split_chunk(chunk, date_col, close_col, cols)
+
+def read_csv_chunks(path, date_column, close_column, descending=False, chunksize=10000, columns=()):
+    # Yields (dates, closes, values) chunks in ascending date order, dates as
+    # int64 nanoseconds and values with one column per name in columns, with
+    # at most chunksize rows in memory at a time.
+    header = read_header(path)
+    date_col = header.index(date_column)
+    close_col = header.index(close_column)
+    cols = [header.index(column) for column in columns]
+
+    if not descending:
+        for chunk in pd.read_csv(path, header=0, usecols=[date_col, close_col] + cols, chunksize=chunksize):
+            yield _split_chunk(chunk, header[date_col], header[close_col], [header[col] for col in cols])
+        return
+
+    lines = []
+    for line in read_lines_reversed(path):
+        lines.append(line)
+        if len(lines) == chunksize:
+            yield _parse_chunk(lines, date_col, close_col, cols)
+            lines = []
+    if lines:
+        yield _parse_chunk(lines, date_col, close_col, cols)
@@ -0,0 +1,237 @@
+import inspect
+import itertools
+import numpy as np
+import os
+import pandas as pd
+import queue
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from data import ArrayDataHandler, HistoricCSVDataHandler, DataSource
+from dispatch import EventQueue
+from execution import SimulateExecutionHandler
+from loop import run
+from performance import calculate_performance
+from portfolio import NaivePortfolio
+from results import portfolio_record
+from strategies.macd import MovingAveragesLongStrategy
+
+class SharedBars:
+    def __init__(self, bars):
+        self.symbol_list = bars.symbol_list
+
+        # The closing prices are shared as the price matrix they are views of.
+        arrays = [(None, None, bars.prices)]
+        for symbol in self.symbol_list:
+            arrays.append((symbol, None, bars.time[symbol].view(np.int64)))
+            for name, column in bars.columns[symbol].items():
+                if name != 'Close':
+                    arrays.append((symbol, name, column))
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(sum(array.nbytes for _, _, array in arrays), 1))
+        self.name = self.shm.name
+        self.layout = []
+        offset = 0
+        for symbol, name, array in arrays:
+            np.ndarray(array.shape, dtype=array.dtype, buffer=self.shm.buf, offset=offset)[:] = array
+            self.layout.append((symbol, name, offset, array.shape, array.dtype.str))
+            offset += array.nbytes
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+def attach_bars(name, layout):
+    shm = shared_memory.SharedMemory(name=name)
+
+    index = {}
+    columns = {}
+    prices = None
+    for symbol, column, offset, shape, dtype in layout:
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+        array.flags.writeable = False
+        if symbol is None:
+            prices = array
+        elif column is None:
+            index[symbol] = pd.DatetimeIndex(array.view('datetime64[ns]'), name='Date')
+            columns[symbol] = {'Close': prices[:, len(columns)]}
+        else:
+            columns[symbol][column] = array
+
+    return shm, index, columns, prices
+
+_worker = {}
+
+def _init_worker(name, layout, symbol_list, strategy_class, initial_capital):
+    shm, index, columns, prices = attach_bars(name, layout)
+    _worker['shm'] = shm
+    _worker['index'] = index
+    _worker['columns'] = columns
+    _worker['prices'] = prices
+    _worker['symbol_list'] = symbol_list
+    _worker['strategy_class'] = strategy_class
+    _worker['initial_capital'] = initial_capital
+    # Only the summary statistics are kept, so nothing needs recording.
+    _worker['options'] = {'record': False} if 'record' in inspect.signature(strategy_class).parameters else {}
+
+def _run_portfolio(parameters):
+    events = EventQueue()
+    data = ArrayDataHandler(events, _worker['symbol_list'], _worker['index'], _worker['columns'], _worker['prices'])
+    portfolio = NaivePortfolio(data, events, '', initial_capital=_worker['initial_capital'])
+    strategy = _worker['strategy_class'](data, events, portfolio, **dict(_worker['options'], **parameters))
+    portfolio.strategy_name = strategy.name
+    broker = SimulateExecutionHandler(events)
+    run(events, data, portfolio, strategy, broker)
+    return portfolio
+
+def _run_parameters(parameters):
+    portfolio = _run_portfolio(parameters)
+    stats = portfolio.calculate_stats()
+    stats.update(parameters)
+    return stats
+
+def _run_record(parameters):
+    portfolio = _run_portfolio(parameters)
+    return portfolio.calculate_stats(), portfolio_record(portfolio)
+
+def expand_grid(parameter_grid):
+    if isinstance(parameter_grid, dict):
+        names = list(parameter_grid.keys())
+        return [dict(zip(names, values)) for values in itertools.product(*parameter_grid.values())]
+    return list(parameter_grid)
+
+class ParameterSweep:
+    def __init__(self, strategy_class, parameter_grid, csv_dir, symbol_list, source=DataSource.NASDAQ, initial_capital=1.0, processes=None, cache=None, store=None):
+        self.strategy_class = strategy_class
+        self.parameters = expand_grid(parameter_grid)
+        self.csv_dir = csv_dir
+        self.symbol_list = symbol_list
+        self.source = source
+        self.initial_capital = initial_capital
+        self.processes = processes or os.cpu_count()
+        self.cache = cache
+        self.store = store
+
+    def _map(self, function, parameters):
+        data = HistoricCSVDataHandler(queue.Queue(), self.csv_dir, self.symbol_list, self.source, cache=self.cache)
+        shared = SharedBars(data.bars)
+        try:
+            chunksize = max(1, len(parameters) // (4 * self.processes))
+            initargs = (shared.name, shared.layout, self.symbol_list, self.strategy_class, self.initial_capital)
+            with ProcessPoolExecutor(max_workers=self.processes, initializer=_init_worker, initargs=initargs) as executor:
+                return list(executor.map(function, parameters, chunksize=chunksize))
+        finally:
+            shared.close()
+
+    def _run_stored(self):
+        # Combinations already in the store are read from it, and only the
+        # others are run and then stored.
+        keys = [self.store.backtest_key(self.csv_dir, self.symbol_list, self.source, self.strategy_class, parameters, self.initial_capital) for parameters in self.parameters]
+        rows = [self.store.load(key) for key in keys]
+        missing = [i for i, row in enumerate(rows) if row is None]
+        if len(missing) > 0:
+            for i, (stats, record) in zip(missing, self._map(_run_record, [self.parameters[i] for i in missing])):
+                self.store.save(keys[i], self.strategy_class, self.symbol_list, self.parameters[i], self.initial_capital, stats, record)
+                rows[i] = stats
+        return [dict(row, **parameters) for row, parameters in zip(rows, self.parameters)]
+
+    def run(self):
+        if self.store is not None:
+            rows = self._run_stored()
+        else:
+            rows = self._map(_run_parameters, self.parameters)
+
+        names = list(self.parameters[0].keys()) if len(self.parameters) > 0 else []
+        results = pd.DataFrame(rows)
+        return results[names + [column for column in results.columns if column not in names]]
+
+def _run_total(parameters):
+    holdings = _run_portfolio(parameters).holdings_ledger
+    return holdings.index[:len(holdings)], holdings.values[:len(holdings), holdings.columns.index('total')].copy()
+
+def walk_forward_windows(length, in_sample, out_of_sample, anchored=False):
+    # Each window is (in-sample start, in-sample stop, out-of-sample stop).
+    # The out-of-sample periods follow each other without overlapping.
+    windows = []
+    stop = in_sample
+    while stop < length:
+        windows.append((0 if anchored else stop - in_sample, stop, min(stop + out_of_sample, length)))
+        stop += out_of_sample
+    return windows
+
+def _window_performance(total, start, stop):
+    total = total[start:stop]
+    returns = np.full(len(total), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns[1:] = total[1:] / total[:-1] - 1.0
+        return calculate_performance(returns, total / total[0])
+
+class WalkForward:
+    # Every parameter combination is backtested once over the whole history,
+    # and each window is scored on its slice of that run. Overlapping windows
+    # thus share the parsed data and the indicator state instead of running
+    # again, and out of sample each window continues the chosen run with its
+    # indicators warmed up and its position as of the start of the window.
+    def __init__(self, strategy_class, parameter_grid, csv_dir, symbol_list, in_sample, out_of_sample, source=DataSource.NASDAQ, objective='sharpe_ratio', maximize=True, anchored=False, initial_capital=1.0, processes=None, cache=None):
+        self.strategy_class = strategy_class
+        self.parameters = expand_grid(parameter_grid)
+        self.csv_dir = csv_dir
+        self.symbol_list = symbol_list
+        self.in_sample = in_sample
+        self.out_of_sample = out_of_sample
+        self.source = source
+        self.objective = objective
+        self.maximize = maximize
+        self.anchored = anchored
+        self.initial_capital = initial_capital
+        self.processes = processes or os.cpu_count()
+        self.cache = cache
+
+    def run(self):
+        data = HistoricCSVDataHandler(queue.Queue(), self.csv_dir, self.symbol_list, self.source, cache=self.cache)
+        shared = SharedBars(data.bars)
+        try:
+            chunksize = max(1, len(self.parameters) // (4 * self.processes))
+            initargs = (shared.name, shared.layout, self.symbol_list, self.strategy_class, self.initial_capital)
+            with ProcessPoolExecutor(max_workers=self.processes, initializer=_init_worker, initargs=initargs) as executor:
+                runs = list(executor.map(_run_total, self.parameters, chunksize=chunksize))
+        finally:
+            shared.close()
+
+        dates = runs[0][0]
+        totals = np.column_stack([total for _, total in runs])
+
+        windows = []
+        returns = []
+        for start, stop, end in walk_forward_windows(len(dates), self.in_sample, self.out_of_sample, self.anchored):
+            scores = np.array([_window_performance(totals[:, k], start, stop)[self.objective] for k in range(len(self.parameters))])
+            scores = np.where(np.isnan(scores), -np.inf, scores if self.maximize else -scores)
+            best = int(np.argmax(scores))
+
+            # The first out-of-sample return is taken from the last in-sample bar.
+            total = totals[stop - 1:end, best]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                returns.append(total[1:] / total[:-1] - 1.0)
+            window = {'in_sample_start': pd.Timestamp(dates[start]), 'in_sample_end': pd.Timestamp(dates[stop - 1]),
+                      'out_of_sample_start': pd.Timestamp(dates[stop]), 'out_of_sample_end': pd.Timestamp(dates[end - 1]),
+                      'in_sample_' + self.objective: scores[best] if self.maximize else -scores[best],
+                      'out_of_sample_return': total[-1] / total[0] - 1.0}
+            window.update(self.parameters[best])
+            windows.append(window)
+
+        self.windows = pd.DataFrame(windows)
+        if len(returns) == 0:
+            raise ValueError("{0} bars do not cover an in-sample period of {1} bars.".format(len(dates), self.in_sample))
+
+        curve = pd.DataFrame({'returns': np.concatenate(returns)}, index=pd.DatetimeIndex(dates[self.in_sample:], name='datetime'))
+        curve['equity_curve'] = (1.0 + curve['returns']).cumprod()
+        self.equity_curve = curve
+        return self.windows
+
+    def calculate_stats(self):
+        return calculate_performance(self.equity_curve['returns'], self.equity_curve['equity_curve'])
+
+if __name__ == '__main__':
+    grid = [{'short_period': s, 'long_period': l, 'version': 2} for s in [5, 10, 50, 100, 200] for l in [s+10, s+50, s+100, s+200]]
+    sweep = ParameterSweep(MovingAveragesLongStrategy, grid, 'csv/', ['OMXS30'], DataSource.NASDAQ, initial_capital=2000)
+    print(sweep.run().to_string(index=False))
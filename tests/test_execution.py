@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data import ArrayDataHandler
+from dispatch import EventQueue
+from event import MarketEvent, OrderEvent
+from execution import Bar, BarExecutionHandler, OrderBook, RestingOrder, SimulateExecutionHandler, VolumeShareFill
+
+FLAT = (100.0, 100.0, 100.0, 100.0, 1000.0)
+
+def create_broker(bars, fill_model=None):
+    # bars are (open, high, low, close, volume) rows of a single symbol. The
+    # first bar is read, so orders placed next are placed on it.
+    columns = {name: np.array([bar[i] for bar in bars], dtype=np.float64) for i, name in enumerate(('Open', 'High', 'Low', 'Close', 'Volume'))}
+    events = EventQueue()
+    data = ArrayDataHandler(events, ['SYM'], {'SYM': pd.date_range('2020-01-01', periods=len(bars))}, {'SYM': columns})
+    broker = BarExecutionHandler(events, data, fill_model=fill_model)
+    data.bars.advance()
+    return events, data, broker
+
+def next_bar(events, data, broker):
+    data.bars.advance()
+    broker.update_bars(MarketEvent())
+    return fills(events)
+
+def fills(events):
+    result = []
+    while not events.empty():
+        event = events.get()
+        result.append((event.quantity, event.direction, event.fill_cost))
+    return result
+
+def test_market_order_fills_at_close_then_open():
+    events, data, broker = create_broker([FLAT, (101.0, 103.0, 99.0, 102.0, 1000.0)])
+    broker.execute_order(OrderEvent('SYM', 'MKT', 10, 'BUY'))
+    assert fills(events) == [(10, 'BUY', 100.0)]
+
+    events, data, broker = create_broker([(100.0, 100.0, 100.0, np.nan, 1000.0), (101.0, 103.0, 99.0, 102.0, 1000.0)])
+    broker.execute_order(OrderEvent('SYM', 'MKT', 10, 'BUY'))
+    assert fills(events) == []
+    assert next_bar(events, data, broker) == [(10, 'BUY', 101.0)]
+
+def test_stop_fills_at_stop_price():
+    events, data, broker = create_broker([FLAT, (99.0, 100.0, 94.0, 96.0, 1000.0)])
+    broker.execute_order(OrderEvent('SYM', 'STP', 10, 'SELL', stop_price=95.0))
+    assert next_bar(events, data, broker) == [(10, 'SELL', 95.0)]
+
+def test_gap_through_stop_fills_at_open():
+    events, data, broker = create_broker([FLAT, FLAT, (90.0, 92.0, 88.0, 91.0, 1000.0)])
+    broker.execute_order(OrderEvent('SYM', 'STP', 10, 'SELL', stop_price=95.0))
+    assert next_bar(events, data, broker) == []
+    assert next_bar(events, data, broker) == [(10, 'SELL', 90.0)]
+
+def test_limit_fills_at_open_below_limit():
+    events, data, broker = create_broker([FLAT, (93.0, 96.0, 92.0, 95.0, 1000.0)])
+    broker.execute_order(OrderEvent('SYM', 'LMT', 10, 'BUY', limit_price=95.0))
+    assert next_bar(events, data, broker) == [(10, 'BUY', 93.0)]
+
+def test_limit_fills_at_limit_within_bar():
+    events, data, broker = create_broker([FLAT, (98.0, 99.0, 94.0, 97.0, 1000.0)])
+    broker.execute_order(OrderEvent('SYM', 'LMT', 10, 'BUY', limit_price=95.0))
+    assert next_bar(events, data, broker) == [(10, 'BUY', 95.0)]
+
+def test_stop_limit_becomes_limit_on_same_bar():
+    events, data, broker = create_broker([FLAT, (100.0, 107.0, 99.0, 104.0, 1000.0)])
+    broker.execute_order(OrderEvent('SYM', 'STP LMT', 10, 'BUY', limit_price=106.0, stop_price=105.0))
+    assert next_bar(events, data, broker) == [(10, 'BUY', 105.0)]
+
+def test_stop_limit_gapping_past_limit_fills_at_limit():
+    events, data, broker = create_broker([FLAT, (108.0, 110.0, 104.0, 109.0, 1000.0)])
+    broker.execute_order(OrderEvent('SYM', 'STP LMT', 10, 'BUY', limit_price=106.0, stop_price=105.0))
+    assert next_bar(events, data, broker) == [(10, 'BUY', 106.0)]
+
+def test_stop_limit_rests_as_limit():
+    events, data, broker = create_broker([FLAT, (108.0, 110.0, 107.0, 109.0, 1000.0), (107.0, 108.0, 105.0, 106.0, 1000.0)])
+    broker.execute_order(OrderEvent('SYM', 'STP LMT', 10, 'BUY', limit_price=106.0, stop_price=105.0))
+    assert next_bar(events, data, broker) == []
+    assert broker.books['SYM'].buy_limits[0][2].order_type == 'LMT'
+    assert next_bar(events, data, broker) == [(10, 'BUY', 106.0)]
+
+def test_volume_share_carries_remainder_over():
+    events, data, broker = create_broker([FLAT, (101.0, 102.0, 100.0, 101.0, 1000.0), (102.0, 103.0, 101.0, 102.0, 1000.0)], VolumeShareFill(0.1))
+    broker.execute_order(OrderEvent('SYM', 'MKT', 250, 'BUY'))
+    assert fills(events) == [(100, 'BUY', 100.0)]
+    assert next_bar(events, data, broker) == [(100, 'BUY', 101.0)]
+    assert next_bar(events, data, broker) == [(50, 'BUY', 102.0)]
+    assert len(broker.books['SYM']) == 0
+
+def test_partly_filled_stop_rests_as_market_order():
+    events, data, broker = create_broker([FLAT, (99.0, 100.0, 94.0, 96.0, 1000.0), (93.0, 94.0, 92.0, 93.0, 1000.0)], VolumeShareFill(0.1))
+    broker.execute_order(OrderEvent('SYM', 'STP', 150, 'SELL', stop_price=95.0))
+    assert next_bar(events, data, broker) == [(100, 'SELL', 95.0)]
+    assert next_bar(events, data, broker) == [(50, 'SELL', 93.0)]
+
+def test_cancel_removes_resting_order():
+    events, data, broker = create_broker([FLAT, (99.0, 100.0, 94.0, 96.0, 1000.0)])
+    broker.execute_order(OrderEvent('SYM', 'STP', 10, 'SELL', stop_price=95.0, order_id='stop'))
+    broker.execute_order(OrderEvent('SYM', 'CANCEL', 0, None, order_id='stop'))
+    assert next_bar(events, data, broker) == []
+    assert 'stop' not in broker.orders
+
+def test_order_id_replaces_resting_order():
+    events, data, broker = create_broker([FLAT, (99.0, 100.0, 94.0, 96.0, 1000.0)])
+    broker.execute_order(OrderEvent('SYM', 'STP', 10, 'SELL', stop_price=95.0, order_id='stop'))
+    broker.execute_order(OrderEvent('SYM', 'STP', 10, 'SELL', stop_price=97.0, order_id='stop'))
+    assert next_bar(events, data, broker) == [(10, 'SELL', 97.0)]
+
+def test_order_book_drops_cancelled_orders():
+    book = OrderBook()
+    orders = [RestingOrder(OrderEvent('SYM', 'LMT', 1, 'BUY', limit_price=float(i))) for i in range(200)]
+    for order in orders:
+        book.add(order)
+    for order in orders[:150]:
+        order.active = False
+        book.cancel()
+    assert len(book) < 200
+    triggered = book.triggered_limits(Bar(None, 0.0, 0.0, 0.0, 0.0, 0.0))
+    assert sorted(order.limit_price for order in triggered) == [float(i) for i in range(150, 200)]
+    assert len(book) == 0
+
+def test_simulate_ignores_cancel():
+    events = EventQueue()
+    broker = SimulateExecutionHandler(events)
+    broker.execute_order(OrderEvent('SYM', 'CANCEL', 0, None, order_id='stop'))
+    assert events.empty()
+
+def test_simulate_refuses_resting_orders():
+    broker = SimulateExecutionHandler(EventQueue())
+    with pytest.raises(ValueError):
+        broker.execute_order(OrderEvent('SYM', 'STP', 10, 'SELL', stop_price=95.0))
@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+import queue
+
+from data import HistoricCSVDataHandler, DataSource
+from dispatch import EventQueue
+from event import calculate_ib_commission
+from execution import BarExecutionHandler
+from loop import run
+from portfolio import NaivePortfolio
+from strategies.hold import BuyAndHoldStrategy, SellAndHoldStrategy
+from strategies.macd import MovingAveragesLongStrategy, MovingAveragesLongShortStrategy
+from strategies.stop_loss import StopLossStrategy
+
+class VectorizedBacktest:
+    def __init__(self, data, strategy, initial_capital=1.0, commission=True):
+        self.data = data
+        self.strategy = strategy
+        self.symbol_list = self.data.symbol_list
+        self.initial_capital = initial_capital
+        self.commission = commission
+
+    def create_price_frame(self):
+        bars = self.data.bars
+        return pd.DataFrame(bars.prices, index=pd.DatetimeIndex(bars.dates, name='Date'), columns=self.symbol_list)
+
+    def calculate_signals(self, price_frame):
+        # Each symbol's signals start at its first price, as its bars do in
+        # the event loop.
+        first = [self.data.bars.first[symbol] for symbol in self.symbol_list]
+        if not any(first):
+            return np.asarray(self.strategy.calculate_vectorized_signals(price_frame), dtype=np.float64)
+
+        signals = np.zeros(price_frame.shape)
+        for j, start in enumerate(first):
+            if start < len(price_frame):
+                signals[start:, j] = np.asarray(self.strategy.calculate_vectorized_signals(price_frame.iloc[start:, [j]]), dtype=np.float64)[:, 0]
+        return signals
+
+    def _fill(self, quantity, direction, price, cash):
+        commission = calculate_ib_commission(quantity, price) if self.commission else 0.0
+        cost = price * direction * quantity
+        return cash - (cost + commission), commission
+
+    def _execute_trades(self, prices, signals, trade_bars, changed):
+        # Sizing depends on the cash left after earlier trades, so only the
+        # bars where a signal changes are walked one by one.
+        positions = np.zeros((len(trade_bars), prices.shape[1]))
+        cash = np.zeros(len(trade_bars))
+        commission = np.zeros(len(trade_bars))
+
+        current_positions = np.zeros(prices.shape[1])
+        current_cash = self.initial_capital
+        current_commission = 0.0
+        for k, t in enumerate(trade_bars):
+            # Every signal on a bar is sized before any of its fills, as in
+            # the event loop.
+            targets = current_positions.copy()
+            for j in np.flatnonzero(changed[t]):
+                targets[j] = self.strategy.vectorized_position(signals[t, j], current_positions[j], current_cash, prices[t, j])
+
+            for j in np.flatnonzero(changed[t]):
+                price = prices[t, j]
+                for fill in self.strategy.vectorized_fills(current_positions[j], targets[j]):
+                    current_cash, fill_commission = self._fill(abs(fill), 1 if fill > 0 else -1, price, current_cash)
+                    current_commission += fill_commission
+
+            current_positions = targets
+            positions[k] = current_positions
+            cash[k] = current_cash
+            commission[k] = current_commission
+
+        return positions, cash, commission
+
+    def run(self):
+        price_frame = self.create_price_frame()
+        prices = price_frame.to_numpy(dtype=np.float64)
+        signals = self.calculate_signals(price_frame)
+
+        changed = np.empty(signals.shape, dtype=bool)
+        changed[0] = signals[0] != 0
+        changed[1:] = signals[1:] != signals[:-1]
+        trade_bars = np.flatnonzero(changed.any(axis=1))
+        trade_positions, trade_cash, trade_commission = self._execute_trades(prices, signals, trade_bars, changed)
+
+        # Holdings are recorded before the fills of the bar, so bar t sees the
+        # state left by the last trade strictly before t.
+        last_trade = np.searchsorted(trade_bars, np.arange(len(prices)), side='left')
+        positions = np.vstack([np.zeros((1, prices.shape[1])), trade_positions])[last_trade]
+        cash = np.concatenate([[self.initial_capital], trade_cash])[last_trade]
+        commission = np.concatenate([[0.0], trade_commission])[last_trade]
+
+        holdings = np.nan_to_num(positions * prices)
+        total = cash + holdings.sum(axis=1)
+
+        index = price_frame.index.rename('datetime')
+        self.positions = pd.DataFrame(positions, index=index, columns=self.symbol_list)
+        curve = pd.DataFrame(holdings, index=index, columns=self.symbol_list)
+        curve['cash'] = cash
+        curve['commission'] = commission
+        curve['total'] = total
+        curve['returns'] = curve['total'].pct_change()
+        curve['equity_curve'] = (1.0 + curve['returns']).cumprod()
+        self.equity_curve = curve
+        self.holdings_curve = curve['total']
+
+        return curve
+
+def _default_strategies():
+    return [
+        lambda data, events, portfolio: BuyAndHoldStrategy(data, events, portfolio),
+        lambda data, events, portfolio: SellAndHoldStrategy(data, events, portfolio),
+        lambda data, events, portfolio: StopLossStrategy(data, events, portfolio, 0.9),
+        lambda data, events, portfolio: MovingAveragesLongStrategy(data, events, portfolio, 50, 100, version=1),
+        lambda data, events, portfolio: MovingAveragesLongStrategy(data, events, portfolio, 50, 100, version=2),
+        lambda data, events, portfolio: MovingAveragesLongShortStrategy(data, events, portfolio, 50, 100, version=1),
+        lambda data, events, portfolio: MovingAveragesLongShortStrategy(data, events, portfolio, 50, 100, version=2),
+    ]
+
+def check_consistency(csv_dir='csv/', symbol_list=['OMXS30'], source=DataSource.NASDAQ, initial_capital=2000, strategies=None, tolerance=1e-6):
+    if strategies is None:
+        strategies = _default_strategies()
+
+    results = []
+    for create_strategy in strategies:
+        events = EventQueue()
+        data = HistoricCSVDataHandler(events, csv_dir, symbol_list, source)
+        portfolio = NaivePortfolio(data, events, '', initial_capital=initial_capital)
+        strategy = create_strategy(data, events, portfolio)
+        broker = BarExecutionHandler(events, data)
+        run(events, data, portfolio, strategy, broker)
+        portfolio.create_equity_curve_dataframe()
+
+        # Market orders fill at the close of their bar, so both runs pay the
+        # same IB commissions.
+        vectorized_portfolio = NaivePortfolio(data, queue.Queue(), '', initial_capital=initial_capital)
+        vectorized_strategy = create_strategy(data, queue.Queue(), vectorized_portfolio)
+        vectorized = VectorizedBacktest(data, vectorized_strategy, initial_capital=initial_capital)
+        vectorized.run()
+
+        name = strategy.name
+        if hasattr(strategy, 'version'):
+            name += ' (version={0})'.format(strategy.version)
+
+        expected = portfolio.equity_curve['total'].to_numpy()
+        actual = vectorized.equity_curve['total'].to_numpy()
+        if len(expected) != len(actual):
+            results.append((name, np.inf, None))
+            print("{0}: {1} event-driven bars, {2} vectorized bars".format(name, len(expected), len(actual)))
+            continue
+
+        difference = np.abs(expected - actual)
+        diverged = np.flatnonzero(difference > tolerance)
+        if len(diverged) > 0:
+            first = portfolio.equity_curve.index[diverged[0]]
+            results.append((name, np.nanmax(difference), first))
+            print("{0}: diverges from {1} (max difference {2:.6f})".format(name, first, np.nanmax(difference)))
+        else:
+            results.append((name, np.nanmax(difference) if len(difference) > 0 else 0.0, None))
+            print("{0}: OK".format(name))
+
+    return results
+
+if __name__ == '__main__':
+    check_consistency()